@@ -2,32 +2,629 @@
 API FastAPI para consultar dados consolidados.
 Endpoints para visualizar clientes, amigos, compras e recomendacoes.
 """
+import asyncio
+import bisect
 import json
 import os
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import redis
+import redis.asyncio as aioredis
+
+from chaves_redis import (
+    CANAL_SNAPSHOT,
+    chave_cliente,
+    chave_indice_clientes,
+    instante_da_versao,
+    resolver_geracao_async,
+    resolver_versao_async,
+)
+from metricas import MIDIA_PROMETHEUS, Registro
+from recomendacao import gerar_recomendacoes
+import conexoes
+import snapshot
+
+REDIS_RETRY_SEGUNDOS = float(os.getenv("REDIS_RETRY_SEGUNDOS", "5"))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "1"))
+REDIS_LOTE_LEITURA = int(os.getenv("REDIS_LOTE_LEITURA", "500"))
+# Maximo de comandos/pipelines em voo no Redis (tambem limita o pool de conexoes)
+REDIS_CONCORRENCIA = int(os.getenv("REDIS_CONCORRENCIA", "64"))
+# Maior pagina aceita em ?limit= nas listagens
+LIMITE_MAXIMO = int(os.getenv("API_LIMITE_MAXIMO", "1000"))
+# Corpos serializados de /todos e /clientes guardados por versao do snapshot
+CACHE_CORPOS = int(os.getenv("API_CACHE_CORPOS", "32"))
+# Cache de respostas por (rota, cliente): maximo de itens (0 desliga) e validade
+CACHE_ITENS = int(os.getenv("API_CACHE_ITENS", "10000"))
+CACHE_TTL_SEGUNDOS = float(os.getenv("API_CACHE_TTL_SEGUNDOS", "300"))
+MIDIA_NDJSON = "application/x-ndjson"
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    ouvinte = asyncio.create_task(_ouvir_invalidacoes(), name="invalidacao-cache")
+    yield
+    ouvinte.cancel()
+    try:
+        await ouvinte
+    except asyncio.CancelledError:
+        pass
+    await fechar_redis()
+    # Conexoes sincronas abertas pelo /health?completo=true
+    await run_in_threadpool(conexoes.fechar)
 
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 
 app = FastAPI(
     title="API Recomendacao de Compras",
     description="Integra dados de PostgreSQL, MongoDB, Neo4j e Redis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=ciclo_de_vida
 )
 
-# Carrega dados do arquivo JSON
-def carregar_dados_json():
-    """Carrega dados do arquivo JSON se disponivel."""
-    if os.path.exists("dados_consolidados.json"):
-        with open("dados_consolidados.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+# Metricas expostas em /metrics
+registro_metricas = Registro()
+LATENCIA = registro_metricas.histograma(
+    "api_requisicao_segundos", "Latencia das requisicoes por metodo, rota e status")
+FALHAS_REDIS = registro_metricas.contador(
+    "api_redis_falhas_total", "Falhas do Redis que fizeram a API usar o arquivo de snapshot")
+ACERTOS_CACHE = registro_metricas.contador(
+    "api_cache_acertos_total", "Respostas servidas do cache local, por rota")
+FALHAS_CACHE = registro_metricas.contador(
+    "api_cache_faltas_total", "Respostas que precisaram ser montadas, por rota")
+INVALIDACOES_CACHE = registro_metricas.contador(
+    "api_cache_invalidacoes_total", "Vezes que os caches locais foram limpos por uma versao nova")
+ITENS_CACHE = registro_metricas.medida(
+    "api_cache_itens", "Respostas guardadas no cache local")
+
+
+@app.middleware("http")
+async def medir_latencia(request: Request, call_next):
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        resposta = await call_next(request)
+        status = resposta.status_code
+        return resposta
+    finally:
+        # Usa o molde da rota (/clientes/{cliente_id}) para nao criar uma serie por id
+        rota = request.scope.get("route")
+        LATENCIA.observar(time.perf_counter() - inicio, metodo=request.method,
+                          rota=getattr(rota, "path", "desconhecida"), status=status)
+
+# Mesmo formato configurado na integracao (SNAPSHOT_FORMATO); a leitura detecta o conteudo
+ARQUIVO_DADOS = snapshot.caminho(os.getenv("ARQUIVO_DADOS", "dados_consolidados.json"))
+
+# Snapshot em memoria: (assinatura do arquivo, dados, ids ordenados). Com o
+# formato indexado, dados eh um SnapshotIndexado (mmap) em vez de um dict. A tupla
+# inteira eh trocada de uma vez, entao quem ja pegou a referencia nunca ve dados
+# pela metade.
+_snapshot = (None, {}, [])
+_snapshot_lock = threading.Lock()
+
+
+def _assinatura_arquivo():
+    """Retorna (mtime, tamanho) do arquivo de dados ou None se nao existir."""
+    try:
+        st = os.stat(ARQUIVO_DADOS)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _snapshot_json(forcar=False):
+    """Retorna a tupla do snapshot em memoria, relendo o arquivo apenas se ele mudou."""
+    global _snapshot
+    assinatura = _assinatura_arquivo()
+    atual = _snapshot
+    if not forcar and atual[0] == assinatura:
+        return atual
+
+    with _snapshot_lock:
+        # Outra thread pode ter recarregado enquanto esperavamos o lock
+        if not forcar and _snapshot[0] == assinatura:
+            return _snapshot
+        if assinatura is None:
+            _snapshot = (None, {}, [])
+            return _snapshot
+        try:
+            dados = snapshot.carregar(ARQUIVO_DADOS)
+        except (OSError, ValueError) as exc:
+            # Arquivo sendo regravado: mantem o snapshot anterior
+            print(f"[AVISO] Falha ao recarregar '{ARQUIVO_DADOS}': {exc}")
+            return _snapshot
+        # Ids ordenados uma vez por snapshot para a paginacao por cursor; o
+        # snapshot indexado (mmap) ja traz o vetor ordenado sem decodificar nada
+        if isinstance(dados, snapshot.SnapshotIndexado):
+            ids = dados.ids
+        else:
+            ids = sorted(int(cid) for cid in dados)
+        _snapshot = (assinatura, dados, ids)
+        return _snapshot
+
+
+async def _snapshot_json_async(forcar=False):
+    """Como _snapshot_json, mas a releitura do arquivo roda fora do event loop."""
+    atual = _snapshot
+    if not forcar and atual[0] == _assinatura_arquivo():
+        return atual
+    return await run_in_threadpool(_snapshot_json, forcar)
+
+
+def _versao_arquivo(assinatura) -> Tuple[Optional[str], Optional[float]]:
+    """(versao, instante de modificacao) do snapshot em arquivo, a partir de (mtime, tamanho)."""
+    if assinatura is None:
+        return None, None
+    mtime_ns, tamanho = assinatura
+    return f"arquivo-{mtime_ns:x}-{tamanho:x}", mtime_ns / 1e9
+
+
+# Pool unico compartilhado por todas as requisicoes do processo. Eh criado na
+# primeira requisicao porque as conexoes assincronas ficam presas ao event loop.
+_redis_pool: Optional[aioredis.ConnectionPool] = None
+# Limita as idas ao Redis em voo; o excedente espera aqui em vez de no pool.
+# Criado junto com o pool, pelo mesmo motivo (fica preso ao event loop).
+_redis_semaforo: Optional[asyncio.Semaphore] = None
+# Depois de uma falha, evita pagar o timeout de conexao em toda requisicao
+_redis_indisponivel_ate = 0.0
+
+CAMPOS_PAYLOAD = ("cliente", "amigos", "compras", "interesses")
+
+
+def obter_redis() -> aioredis.Redis:
+    """Retorna um cliente Redis assincrono que usa o pool compartilhado."""
+    global _redis_pool
+    if _redis_pool is None:
+        _redis_pool = aioredis.ConnectionPool(
+            **conexoes.parametros_redis(),
+            socket_connect_timeout=REDIS_TIMEOUT,
+            socket_timeout=REDIS_TIMEOUT,
+            max_connections=REDIS_CONCORRENCIA,
+        )
+    return aioredis.Redis(connection_pool=_redis_pool)
+
+
+def _redis_dedicado() -> aioredis.Redis:
+    """Cliente com pool proprio de uma conexao, com os parametros do pool compartilhado.
+
+    Para quem prende a conexao pela vida toda da API (a assinatura do pub/sub): o
+    pool compartilhado tem exatamente REDIS_CONCORRENCIA conexoes, uma para cada
+    vaga do semaforo das requisicoes.
+    """
+    pool = obter_redis().connection_pool
+    return aioredis.Redis(connection_pool=pool.__class__(
+        connection_class=pool.connection_class, max_connections=1, **pool.connection_kwargs
+    ))
+
+
+def _limite_redis() -> asyncio.Semaphore:
+    global _redis_semaforo
+    if _redis_semaforo is None:
+        _redis_semaforo = asyncio.Semaphore(REDIS_CONCORRENCIA)
+    return _redis_semaforo
+
+
+async def fechar_redis():
+    """Fecha as conexoes do pool (chamado no desligamento da API)."""
+    global _redis_pool, _redis_semaforo
+    pool, _redis_pool = _redis_pool, None
+    _redis_semaforo = None
+    if pool is not None:
+        await pool.disconnect()
+
+
+def _redis_ativo():
+    return time.monotonic() >= _redis_indisponivel_ate
+
+
+def _marcar_redis_indisponivel(exc):
+    global _redis_indisponivel_ate
+    _redis_indisponivel_ate = time.monotonic() + REDIS_RETRY_SEGUNDOS
+    FALHAS_REDIS.incrementar()
+    print(f"[AVISO] Redis indisponivel, usando arquivo JSON: {exc}")
+
+
+def _valor_hash(valor):
+    """gravar_redis grava None como a string 'None'."""
+    return None if valor in ("None", "") else valor
+
+
+def _cliente_do_hash(dados_hash: Dict[str, str]) -> Dict[str, Any]:
+    cliente = {k: _valor_hash(v) for k, v in dados_hash.items()}
+    if cliente.get("id") is not None:
+        cliente["id"] = int(cliente["id"])
+    return cliente
+
+
+def _enfileirar_cliente(pipe, geracao: int, cid: int, campos: Tuple[str, ...]):
+    base_key = chave_cliente(geracao, cid)
+    pipe.hgetall(base_key)
+    if "amigos" in campos:
+        pipe.lrange(f"{base_key}:amigos", 0, -1)
+    if "compras" in campos:
+        pipe.lrange(f"{base_key}:compras", 0, -1)
+    if "interesses" in campos:
+        pipe.get(f"{base_key}:interesses")
+    if "recs" in campos:
+        pipe.get(f"{base_key}:recs")
+
+
+def _payload_redis(respostas: Iterator[Any], campos: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """Consome as respostas de um cliente na mesma ordem de _enfileirar_cliente."""
+    dados_hash = next(respostas)
+    payload: Dict[str, Any] = {}
+    if "amigos" in campos:
+        payload["amigos"] = [int(a) for a in next(respostas)]
+    if "compras" in campos:
+        payload["compras"] = [json.loads(c) for c in next(respostas)]
+    if "interesses" in campos:
+        interesses = next(respostas)
+        payload["interesses"] = json.loads(interesses) if interesses else {}
+    if "recs" in campos:
+        recs = next(respostas)
+        if recs is not None:
+            payload["recs"] = json.loads(recs)
+    if not dados_hash:
+        return None
+    payload["cliente"] = _cliente_do_hash(dados_hash)
+    return payload
+
+
+async def _ler_payloads_redis(r, geracao: int, ids: List[int], campos: Tuple[str, ...]) -> Dict[int, Dict[str, Any]]:
+    """Busca varios clientes de uma geracao em um unico pipeline."""
+    pipe = r.pipeline(transaction=False)
+    for cid in ids:
+        _enfileirar_cliente(pipe, geracao, cid, campos)
+    async with _limite_redis():
+        respostas = iter(await pipe.execute())
+
+    resultado = {}
+    for cid in ids:
+        payload = _payload_redis(respostas, campos)
+        if payload is not None:
+            resultado[cid] = payload
+    return resultado
+
+
+async def _ids_redis(r, geracao: int, apos: Optional[int], limite: int) -> List[int]:
+    """Proximos ids (> apos) da geracao, em ordem, pelo indice ordenado v{n}:clientes."""
+    minimo = "-inf" if apos is None else f"({apos}"
+    async with _limite_redis():
+        ids = await r.zrangebyscore(chave_indice_clientes(geracao), minimo, "+inf", start=0, num=limite)
+    return [int(cid) for cid in ids]
+
+
+class FonteDados:
+    """Fonte de leitura fixada no inicio da requisicao.
+
+    A geracao do Redis eh resolvida uma unica vez, entao todas as leituras de uma
+    mesma requisicao enxergam o mesmo snapshot mesmo se a integracao trocar o
+    ponteiro no meio. Sem Redis, usa o snapshot JSON em memoria.
+
+    A versao (publicada pela integracao no Redis, ou a assinatura do arquivo)
+    vira o ETag/Last-Modified das respostas.
+    """
+
+    def __init__(self, geracao: Optional[int] = None, snapshot=None, versao: Optional[str] = None):
+        self.geracao = geracao
+        self.versao: Optional[str] = None
+        self.modificado_em: Optional[float] = None
+        if versao is not None:
+            self.versao = f"redis-{versao}"
+            self.modificado_em = instante_da_versao(versao)
+        self._dados: Mapping[str, Any] = {}
+        self._ids: List[int] = []
+        # Resposta (e variante) cujos validadores acompanham a fonte; veja anexar_validadores
+        self._resposta: Optional[Tuple[Response, str]] = None
+        if snapshot is not None:
+            self._usar_snapshot(snapshot)
+
+    def _usar_snapshot(self, snapshot):
+        assinatura, self._dados, self._ids = snapshot
+        self.versao, self.modificado_em = _versao_arquivo(assinatura)
+
+    async def _usar_json(self, exc):
+        _marcar_redis_indisponivel(exc)
+        self.geracao = None
+        self._usar_snapshot(await _snapshot_json_async())
+        # Os dados agora vem do arquivo: o ETag da versao do Redis deixaria o cliente
+        # guardar o fallback como se fosse aquela versao
+        self._aplicar_validadores()
+
+    def anexar_validadores(self, response: Response, variante: str = ""):
+        """Poe ETag/Last-Modified em response e os troca se a fonte mudar no meio da rota."""
+        self._resposta = (response, variante)
+        self._aplicar_validadores()
+
+    def _aplicar_validadores(self):
+        if self._resposta is None:
+            return
+        response, variante = self._resposta
+        for nome in ("ETag", "Last-Modified"):
+            if nome in response.headers:
+                del response.headers[nome]
+        response.headers.update(self.validadores(variante))
+
+    def validadores(self, variante: str = "") -> Dict[str, str]:
+        """Cabecalhos ETag/Last-Modified da versao; variante separa representacoes (ex.: ndjson)."""
+        if self.versao is None:
+            return {}
+        etag = f"{self.versao}-{variante}" if variante else self.versao
+        cabecalhos = {"ETag": f'"{etag}"', "Vary": "Accept"}
+        if self.modificado_em is not None:
+            cabecalhos["Last-Modified"] = formatdate(self.modificado_em, usegmt=True)
+        return cabecalhos
+
+    def nao_modificado(self, request: Request, variante: str = "") -> bool:
+        """True se If-None-Match/If-Modified-Since do cliente ainda valem para esta versao."""
+        cabecalhos = self.validadores(variante)
+        if not cabecalhos:
+            return False
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match tem precedencia; comparacao fraca, como pede a RFC 9110
+            etags = [e.strip() for e in if_none_match.split(",")]
+            return "*" in etags or cabecalhos["ETag"] in (e[2:] if e.startswith("W/") else e for e in etags)
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.modificado_em is not None:
+            try:
+                return int(self.modificado_em) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def obter_payloads(self, ids: Iterable[int], campos: Tuple[str, ...] = CAMPOS_PAYLOAD) -> Dict[int, Dict[str, Any]]:
+        """Retorna {id: payload} dos clientes encontrados."""
+        ids = list(dict.fromkeys(ids))
+        if self.geracao is not None:
+            try:
+                return await _ler_payloads_redis(obter_redis(), self.geracao, ids, campos)
+            except redis.RedisError as exc:
+                await self._usar_json(exc)
+        return {cid: self._dados[str(cid)] for cid in ids if str(cid) in self._dados}
+
+    async def obter_payload(self, cliente_id: int, campos: Tuple[str, ...] = CAMPOS_PAYLOAD) -> Optional[Dict[str, Any]]:
+        """Retorna o payload de um cliente ou None."""
+        return (await self.obter_payloads([cliente_id], campos)).get(cliente_id)
+
+    async def obter_payload_ou_404(self, cliente_id: int, campos: Tuple[str, ...] = CAMPOS_PAYLOAD) -> Dict[str, Any]:
+        payload = await self.obter_payload(cliente_id, campos)
+        if not payload:
+            raise HTTPException(status_code=404, detail=f"Cliente {cliente_id} nao encontrado")
+        return payload
+
+    async def _listar_redis(self, campos, apos, limite):
+        r = obter_redis()
+        restante = limite
+        while restante is None or restante > 0:
+            tamanho = REDIS_LOTE_LEITURA if restante is None else min(restante, REDIS_LOTE_LEITURA)
+            lote = await _ids_redis(r, self.geracao, apos, tamanho)
+            if not lote:
+                return
+            pagina = await _ler_payloads_redis(r, self.geracao, lote, campos)
+            for cid in lote:
+                if cid in pagina:
+                    yield cid, pagina[cid]
+            apos = lote[-1]
+            if restante is not None:
+                restante -= len(lote)
+
+    async def listar_payloads(self, campos: Tuple[str, ...] = CAMPOS_PAYLOAD, apos: Optional[int] = None,
+                              limite: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Percorre os clientes com id > apos em ordem de id, no maximo limite.
+
+        E um gerador: o Redis eh lido em paginas de REDIS_LOTE_LEITURA ids (um
+        ZRANGEBYSCORE e um pipeline por pagina) conforme o consumidor avanca.
+        """
+        if self.geracao is not None:
+            entregues = 0
+            try:
+                async for item in self._listar_redis(campos, apos, limite):
+                    entregues += 1
+                    yield item
+                return
+            except redis.RedisError as exc:
+                # Depois de comecar a entregar nao da para trocar de fonte
+                if entregues:
+                    raise
+                await self._usar_json(exc)
+        inicio = 0 if apos is None else bisect.bisect_right(self._ids, apos)
+        fim = len(self._ids) if limite is None else inicio + limite
+        for cid in self._ids[inicio:fim]:
+            yield int(cid), self._dados[str(cid)]
+
+
+async def fonte_dados() -> FonteDados:
+    """Dependencia das rotas: resolve a geracao do Redis uma vez por requisicao."""
+    if _redis_ativo():
+        try:
+            async with _limite_redis():
+                geracao, versao = await resolver_versao_async(obter_redis())
+            if geracao is not None:
+                return FonteDados(geracao, versao=versao)
+        except redis.RedisError as exc:
+            _marcar_redis_indisponivel(exc)
+    return FonteDados(snapshot=await _snapshot_json_async())
+
+
+class NaoModificado(Exception):
+    """Interrompe a rota quando o cliente ja tem a versao atual (vira um 304)."""
+
+    def __init__(self, cabecalhos: Dict[str, str]):
+        super().__init__("nao modificado")
+        self.cabecalhos = cabecalhos
+
+
+@app.exception_handler(NaoModificado)
+async def responder_nao_modificado(request: Request, exc: NaoModificado):
+    return Response(status_code=304, headers=exc.cabecalhos)
+
+
+def _variante(request: Request) -> str:
+    return "ndjson" if _quer_ndjson(request, request.query_params.get("formato")) else ""
+
+
+async def fonte_versionada(request: Request, response: Response,
+                           fonte: FonteDados = Depends(fonte_dados)) -> FonteDados:
+    """Como fonte_dados, mas responde 304 sem ler nenhum cliente se a versao nao mudou."""
+    variante = _variante(request)
+    if fonte.nao_modificado(request, variante):
+        raise NaoModificado(fonte.validadores(variante))
+    fonte.anexar_validadores(response, variante)
+    return fonte
+
+
+async def fonte_do_cliente(cliente_id: int, request: Request, response: Response,
+                           fonte: FonteDados = Depends(fonte_dados)) -> FonteDados:
+    """fonte_versionada das rotas /clientes/{cliente_id}: so responde 304 se o cliente existe.
+
+    O ETag eh da versao do snapshot, nao do cliente, entao um id inexistente com
+    o ETag atual levaria 304 em vez de 404. A existencia so eh lida quando os
+    validadores batem; nos demais casos a propria rota da o 404.
+    """
+    variante = _variante(request)
+    if fonte.nao_modificado(request, variante):
+        await fonte.obter_payload_ou_404(cliente_id, ("cliente",))
+        # A leitura pode ter caido para o arquivo, que tem outra versao
+        if fonte.nao_modificado(request, variante):
+            raise NaoModificado(fonte.validadores(variante))
+    fonte.anexar_validadores(response, variante)
+    return fonte
+
+
+class CacheLRU:
+    """Cache em memoria com limite de itens (LRU) e validade (TTL).
+
+    Cada item guarda a versao do snapshot de onde veio; um item de outra versao
+    conta como falta, entao o cache nunca serve dados de uma integracao anterior
+    mesmo que o aviso pelo canal se perca. Usado so dentro do event loop, por isso
+    dispensa lock.
+    """
+
+    def __init__(self, maximo: int, ttl: float):
+        self.maximo = maximo
+        self.ttl = ttl
+        # chave -> (expira em, versao, valor)
+        self._itens: "OrderedDict[Any, Tuple[float, str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def obter(self, chave, versao: Optional[str]):
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        expira_em, versao_item, valor = item
+        if versao_item != versao or expira_em <= time.monotonic():
+            del self._itens[chave]
+            return None
+        self._itens.move_to_end(chave)
+        return valor
+
+    def guardar(self, chave, versao: str, valor):
+        if self.maximo <= 0:
+            return
+        self._itens[chave] = (time.monotonic() + self.ttl, versao, valor)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.maximo:
+            self._itens.popitem(last=False)
+
+    def limpar(self):
+        self._itens.clear()
+
+
+cache_respostas = CacheLRU(CACHE_ITENS, CACHE_TTL_SEGUNDOS)
+
+
+async def _resposta_cacheada(rota: str, cliente_id: int, fonte: FonteDados, montar):
+    """Devolve a resposta de (rota, cliente) do cache ou a monta e guarda."""
+    chave = (rota, cliente_id)
+    resposta = cache_respostas.obter(chave, fonte.versao)
+    if resposta is not None:
+        ACERTOS_CACHE.incrementar(rota=rota)
+        return resposta
+    FALHAS_CACHE.incrementar(rota=rota)
+    resposta = await montar()
+    # Versao lida depois de montar: se o Redis falhou no meio, vale a do arquivo
+    if fonte.versao is not None:
+        cache_respostas.guardar(chave, fonte.versao, resposta)
+        ITENS_CACHE.definir(len(cache_respostas))
+    return resposta
+
+
+def _invalidar_caches(versao: Optional[str] = None):
+    cache_respostas.limpar()
+    _corpos.clear()
+    ITENS_CACHE.definir(0)
+    INVALIDACOES_CACHE.incrementar()
+    if versao:
+        print(f"[Cache] Versao {versao} publicada; caches locais limpos")
+
+
+async def _ouvir_invalidacoes():
+    """Assina o canal da integracao e limpa os caches a cada versao publicada.
+
+    Roda durante toda a vida da API, em cada worker. Se o Redis cair, tenta de
+    novo a cada REDIS_RETRY_SEGUNDOS; ao reconectar limpa os caches, porque um
+    anuncio pode ter sido perdido nesse intervalo.
+    """
+    avisado = False
+    while True:
+        try:
+            cliente = _redis_dedicado()
+            pubsub = cliente.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(CANAL_SNAPSHOT)
+                if avisado:
+                    print("[Cache] Inscricao no canal de invalidacao restabelecida")
+                    _invalidar_caches()
+                avisado = False
+                while True:
+                    # Timeout curto: o socket do pool tem socket_timeout e nao pode ficar bloqueado
+                    mensagem = await pubsub.get_message(timeout=REDIS_TIMEOUT / 2)
+                    if mensagem is not None and mensagem["type"] == "message":
+                        _invalidar_caches(mensagem["data"])
+            finally:
+                await pubsub.aclose()
+                await cliente.connection_pool.disconnect()
+        except redis.RedisError as exc:
+            if not avisado:
+                print(f"[AVISO] Sem inscricao no canal de invalidacao ({exc}); caches expiram pelo TTL")
+                avisado = True
+            await asyncio.sleep(REDIS_RETRY_SEGUNDOS)
+
+
+# Corpos ja serializados das listagens, so da versao atual: (rota, after, limit) -> bytes
+_corpos: "OrderedDict[Tuple, bytes]" = OrderedDict()
+_corpos_versao: Optional[str] = None
+
+
+async def _resposta_em_cache(fonte: FonteDados, chave: Tuple, montar) -> Response:
+    """Serializa o resultado de montar() uma vez por versao e reaproveita os bytes."""
+    global _corpos_versao
+    corpo = _corpos.get(chave) if fonte.versao is not None and fonte.versao == _corpos_versao else None
+    if corpo is not None:
+        _corpos.move_to_end(chave)
+    else:
+        corpo = JSONResponse(await montar()).body
+        # A versao eh lida depois de montar: se o Redis falhou no meio, vale a do arquivo
+        if fonte.versao is not None:
+            if fonte.versao != _corpos_versao:
+                _corpos.clear()
+                _corpos_versao = fonte.versao
+            _corpos[chave] = corpo
+            while len(_corpos) > CACHE_CORPOS:
+                _corpos.popitem(last=False)
+    return Response(corpo, media_type="application/json", headers=fonte.validadores())
 
 @app.get("/")
-def raiz():
+async def raiz():
     """Endpoint raiz com informacoes sobre a API."""
     return {
         "mensagem": "API de Recomendacao de Compras",
@@ -38,40 +635,90 @@ def raiz():
             "cliente_amigos": "/clientes/{id}/amigos",
             "cliente_compras": "/clientes/{id}/compras",
             "cliente_recomendacoes": "/clientes/{id}/recomendacoes",
-            "todos": "/todos"
+            "lote": "POST /clientes/batch, /clientes/batch/compras, /clientes/batch/recomendacoes",
+            "todos": "/todos",
+            "metricas": "/metrics"
         }
     }
 
-@app.get("/clientes")
-def listar_clientes():
-    """Lista todos os clientes."""
-    dados = carregar_dados_json()
-    
-    clientes = []
-    for cid, payload in dados.items():
-        cli = payload.get("cliente", {})
-        clientes.append({
-            "id": cli.get("id"),
-            "nome": cli.get("nome"),
-            "cpf": cli.get("cpf"),
-            "email": cli.get("email"),
-            "cidade": cli.get("cidade")
-        })
-    
+def _resumo_cliente(payload: Dict[str, Any]) -> Dict[str, Any]:
+    cli = payload.get("cliente", {})
     return {
-        "total": len(clientes),
-        "clientes": clientes
+        "id": cli.get("id"),
+        "nome": cli.get("nome"),
+        "cpf": cli.get("cpf"),
+        "email": cli.get("email"),
+        "cidade": cli.get("cidade")
     }
 
-@app.get("/clientes/{cliente_id}")
-def obter_cliente(cliente_id: int):
-    """Obtém detalhes de um cliente especifico."""
-    dados = carregar_dados_json()
-    
-    payload = dados.get(str(cliente_id))
-    if not payload:
-        raise HTTPException(status_code=404, detail=f"Cliente {cliente_id} nao encontrado")
-    
+
+def _resumo_todos(payload: Dict[str, Any]) -> Dict[str, Any]:
+    cli = payload.get("cliente", {})
+    return {
+        "nome": cli.get("nome"),
+        "total_compras": len(payload.get("compras", [])),
+        "total_amigos": len(payload.get("amigos", [])),
+        "interesses": payload.get("interesses", {}).get("interesses", [])
+    }
+
+
+def _quer_ndjson(request: Request, formato: Optional[str]) -> bool:
+    return formato == "ndjson" or MIDIA_NDJSON in request.headers.get("accept", "")
+
+
+async def _pagina(fonte: FonteDados, campos: Tuple[str, ...], apos: Optional[int], limite: Optional[int]):
+    """Le ate limite clientes depois de apos; retorna (itens, cursor da proxima pagina)."""
+    itens = [item async for item in fonte.listar_payloads(campos, apos, None if limite is None else limite + 1)]
+    if limite is not None and len(itens) > limite:
+        itens = itens[:limite]
+        return itens, itens[-1][0]
+    return itens, None
+
+
+async def _resposta_ndjson(fonte: FonteDados, campos, apos, limite, montar) -> StreamingResponse:
+    """Uma linha JSON por cliente, gerada conforme o snapshot/Redis eh percorrido.
+
+    O primeiro cliente eh lido antes de montar a resposta: se o Redis falhar ali a
+    fonte passa para o arquivo, e os cabecalhos ja saem com a versao do arquivo.
+    """
+    payloads = fonte.listar_payloads(campos, apos, limite)
+    primeiro = await anext(payloads, None)
+
+    async def linhas():
+        if primeiro is None:
+            return
+        cid, payload = primeiro
+        yield json.dumps({"id": cid, **montar(payload)}, ensure_ascii=False) + "\n"
+        async for cid, payload in payloads:
+            yield json.dumps({"id": cid, **montar(payload)}, ensure_ascii=False) + "\n"
+    return StreamingResponse(linhas(), media_type=MIDIA_NDJSON, headers=fonte.validadores("ndjson"))
+
+
+@app.get("/clientes")
+async def listar_clientes(
+    request: Request,
+    after: Optional[int] = Query(None, description="Cursor: retorna clientes com id maior que este"),
+    limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description="Tamanho da pagina"),
+    formato: Optional[str] = Query(None, description="'ndjson' para streaming (ou Accept: application/x-ndjson)"),
+    fonte: FonteDados = Depends(fonte_versionada),
+):
+    """Lista os clientes em ordem de id, com paginacao por cursor opcional."""
+    campos = ("cliente",)
+    if _quer_ndjson(request, formato):
+        return await _resposta_ndjson(fonte, campos, after, limit, _resumo_cliente)
+
+    async def montar():
+        itens, proximo = await _pagina(fonte, campos, after, limit)
+        clientes = [_resumo_cliente(payload) for _, payload in itens]
+        return {
+            "total": len(clientes),
+            "clientes": clientes,
+            "proximo": proximo
+        }
+
+    return await _resposta_em_cache(fonte, ("clientes", after, limit), montar)
+
+def _detalhe_cliente(payload: Dict[str, Any]) -> Dict[str, Any]:
     cli = payload.get("cliente", {})
     return {
         "id": cli.get("id"),
@@ -83,21 +730,23 @@ def obter_cliente(cliente_id: int):
         "uf": cli.get("uf")
     }
 
-@app.get("/clientes/{cliente_id}/amigos")
-def obter_amigos(cliente_id: int):
-    """Lista amigos de um cliente."""
-    dados = carregar_dados_json()
-    
-    payload = dados.get(str(cliente_id))
-    if not payload:
-        raise HTTPException(status_code=404, detail=f"Cliente {cliente_id} nao encontrado")
+
+@app.get("/clientes/{cliente_id}")
+async def obter_cliente(cliente_id: int, fonte: FonteDados = Depends(fonte_do_cliente)):
+    """Obtém detalhes de um cliente especifico."""
+    payload = await fonte.obter_payload_ou_404(cliente_id, ("cliente",))
+    return _detalhe_cliente(payload)
+
+async def _montar_amigos(cliente_id: int, fonte: FonteDados) -> Dict[str, Any]:
+    payload = await fonte.obter_payload_ou_404(cliente_id, ("cliente", "amigos"))
     
     amigos = payload.get("amigos", [])
     
-    # Enriquece com dados dos amigos
+    # Enriquece com dados dos amigos (um unico pipeline para todos)
+    amigos_payloads = await fonte.obter_payloads(amigos, ("cliente",))
     amigos_detalhes = []
     for aid in amigos:
-        amigo_payload = dados.get(str(aid))
+        amigo_payload = amigos_payloads.get(aid)
         if amigo_payload:
             amigo_cli = amigo_payload.get("cliente", {})
             amigos_detalhes.append({
@@ -113,15 +762,13 @@ def obter_amigos(cliente_id: int):
         "amigos": amigos_detalhes
     }
 
-@app.get("/clientes/{cliente_id}/compras")
-def obter_compras(cliente_id: int):
-    """Lista compras de um cliente."""
-    dados = carregar_dados_json()
-    
-    payload = dados.get(str(cliente_id))
-    if not payload:
-        raise HTTPException(status_code=404, detail=f"Cliente {cliente_id} nao encontrado")
-    
+
+@app.get("/clientes/{cliente_id}/amigos")
+async def obter_amigos(cliente_id: int, fonte: FonteDados = Depends(fonte_do_cliente)):
+    """Lista amigos de um cliente."""
+    return await _resposta_cacheada("amigos", cliente_id, fonte, lambda: _montar_amigos(cliente_id, fonte))
+
+def _compras_cliente(cliente_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
     compras = payload.get("compras", [])
     
     compras_formatadas = []
@@ -142,85 +789,197 @@ def obter_compras(cliente_id: int):
         "compras": compras_formatadas
     }
 
-@app.get("/clientes/{cliente_id}/recomendacoes")
-def obter_recomendacoes(cliente_id: int):
-    """Gera recomendacoes baseado em amigos e interesses."""
-    dados = carregar_dados_json()
-    
-    payload = dados.get(str(cliente_id))
-    if not payload:
-        raise HTTPException(status_code=404, detail=f"Cliente {cliente_id} nao encontrado")
-    
+
+@app.get("/clientes/{cliente_id}/compras")
+async def obter_compras(cliente_id: int, fonte: FonteDados = Depends(fonte_do_cliente)):
+    """Lista compras de um cliente."""
+    payload = await fonte.obter_payload_ou_404(cliente_id, ("cliente", "compras"))
+    return _compras_cliente(cliente_id, payload)
+
+# Os amigos vem no mesmo pipeline, para o caso de as recs precisarem ser calculadas
+CAMPOS_RECOMENDACOES = ("cliente", "amigos", "interesses", "recs")
+
+
+async def _compras_dos_amigos(fonte: FonteDados, payloads: Iterable[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Compras dos amigos de quem nao tem recomendacoes gravadas, em um unico pipeline."""
+    amigos = [aid for payload in payloads if payload.get("recs") is None for aid in payload.get("amigos", [])]
+    if not amigos:
+        return {}
+    return await fonte.obter_payloads(amigos, ("compras",))
+
+
+def _recomendacoes_cliente(cliente_id: int, payload: Dict[str, Any],
+                           amigos_payloads: Mapping[int, Dict[str, Any]]) -> Dict[str, Any]:
     # Interesses do cliente
     interesses_cli = payload.get("interesses", {}).get("interesses", [])
     
-    # Compras dos amigos
-    amigos = payload.get("amigos", [])
-    produtos_amigos = {}
-    
-    for aid in amigos:
-        amigo_payload = dados.get(str(aid))
-        if amigo_payload:
-            for compra in amigo_payload.get("compras", []):
-                prod = compra.get("produto", {})
-                prod_id = prod.get("id")
-                if prod_id not in produtos_amigos:
-                    produtos_amigos[prod_id] = {
-                        "produto": prod.get("produto"),
-                        "tipo": prod.get("tipo"),
-                        "valor": prod.get("valor"),
-                        "comprado_por_amigos": 0,
-                        "motivo": ""
-                    }
-                produtos_amigos[prod_id]["comprado_por_amigos"] += 1
-    
-    # Filtra recomendacoes por tipo/interesse
-    recomendacoes = []
-    for prod_id, info in produtos_amigos.items():
-        if info["tipo"] in interesses_cli or any(palavra in info["produto"].lower() for palavra in interesses_cli):
-            recomendacoes.append({
-                "produto": info["produto"],
-                "tipo": info["tipo"],
-                "valor": info["valor"],
-                "motivo": f"Amigos seus compraram. Voce tem interesse em {info['tipo']}",
-                "comprado_por": info["comprado_por_amigos"]
-            })
+    recomendacoes = payload.get("recs")
+    if recomendacoes is None:
+        # Cliente sem recomendacoes gravadas: usa as compras dos amigos
+        amigos = payload.get("amigos", [])
+        recomendacoes = gerar_recomendacoes(
+            interesses_cli,
+            (amigos_payloads[aid].get("compras", []) for aid in amigos if aid in amigos_payloads),
+        )
     
     return {
         "cliente_id": cliente_id,
         "interesses": interesses_cli,
         "total_recomendacoes": len(recomendacoes),
-        "recomendacoes": sorted(recomendacoes, key=lambda x: x["comprado_por"], reverse=True)
+        "recomendacoes": recomendacoes
     }
 
-@app.get("/todos")
-def obter_tudo():
-    """Retorna todos os dados consolidados."""
-    dados = carregar_dados_json()
-    
-    resultado = {
-        "total_clientes": len(dados),
-        "resumo": {}
+
+async def _montar_recomendacoes(cliente_id: int, fonte: FonteDados) -> Dict[str, Any]:
+    payload = await fonte.obter_payload_ou_404(cliente_id, CAMPOS_RECOMENDACOES)
+    return _recomendacoes_cliente(cliente_id, payload, await _compras_dos_amigos(fonte, [payload]))
+
+
+@app.get("/clientes/{cliente_id}/recomendacoes")
+async def obter_recomendacoes(cliente_id: int, fonte: FonteDados = Depends(fonte_do_cliente)):
+    """Retorna as recomendacoes calculadas pela integracao (ou calcula na hora se faltarem)."""
+    return await _resposta_cacheada("recomendacoes", cliente_id, fonte,
+                                    lambda: _montar_recomendacoes(cliente_id, fonte))
+
+
+def _validar_lote(ids: List[int]) -> List[int]:
+    """Remove ids repetidos (mantendo a ordem) e limita o tamanho do lote."""
+    if len(ids) > LIMITE_MAXIMO:
+        raise HTTPException(status_code=422, detail=f"No maximo {LIMITE_MAXIMO} ids por lote")
+    return list(dict.fromkeys(ids))
+
+
+def _resposta_lote(ids: List[int], encontrados: Mapping[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Um resultado por id, na ordem pedida; ids inexistentes viram itens 404 em vez de falhar o lote."""
+    resultados = []
+    nao_encontrados = []
+    for cid in ids:
+        if cid in encontrados:
+            resultados.append({"id": cid, "status": 200, "dados": encontrados[cid]})
+        else:
+            nao_encontrados.append(cid)
+            resultados.append({"id": cid, "status": 404, "erro": f"Cliente {cid} nao encontrado"})
+    return {
+        "total": len(ids),
+        "encontrados": len(ids) - len(nao_encontrados),
+        "nao_encontrados": nao_encontrados,
+        "resultados": resultados
     }
-    
-    for cid, payload in dados.items():
-        cli = payload.get("cliente", {})
-        resultado["resumo"][cid] = {
-            "nome": cli.get("nome"),
-            "total_compras": len(payload.get("compras", [])),
-            "total_amigos": len(payload.get("amigos", [])),
-            "interesses": payload.get("interesses", {}).get("interesses", [])
+
+
+@app.post("/clientes/batch")
+async def obter_clientes_lote(
+    ids: List[int] = Body(..., embed=True, description="Ids dos clientes"),
+    fonte: FonteDados = Depends(fonte_dados),
+):
+    """Detalhes de varios clientes de uma vez (um unico pipeline no Redis)."""
+    ids = _validar_lote(ids)
+    payloads = await fonte.obter_payloads(ids, ("cliente",))
+    return _resposta_lote(ids, {cid: _detalhe_cliente(payload) for cid, payload in payloads.items()})
+
+
+@app.post("/clientes/batch/compras")
+async def obter_compras_lote(
+    ids: List[int] = Body(..., embed=True, description="Ids dos clientes"),
+    fonte: FonteDados = Depends(fonte_dados),
+):
+    """Compras de varios clientes de uma vez (um unico pipeline no Redis)."""
+    ids = _validar_lote(ids)
+    payloads = await fonte.obter_payloads(ids, ("cliente", "compras"))
+    return _resposta_lote(ids, {cid: _compras_cliente(cid, payload) for cid, payload in payloads.items()})
+
+
+@app.post("/clientes/batch/recomendacoes")
+async def obter_recomendacoes_lote(
+    ids: List[int] = Body(..., embed=True, description="Ids dos clientes"),
+    fonte: FonteDados = Depends(fonte_dados),
+):
+    """Recomendacoes de varios clientes; usa o cache por cliente e le so os que faltam.
+
+    Os clientes ausentes do cache vem em um pipeline e as compras dos amigos
+    (so para quem nao tem recomendacoes gravadas) em outro.
+    """
+    ids = _validar_lote(ids)
+    encontrados: Dict[int, Dict[str, Any]] = {}
+    faltando = []
+    for cid in ids:
+        resposta = cache_respostas.obter(("recomendacoes", cid), fonte.versao)
+        if resposta is not None:
+            encontrados[cid] = resposta
+        else:
+            faltando.append(cid)
+    if encontrados:
+        ACERTOS_CACHE.incrementar(len(encontrados), rota="recomendacoes")
+
+    if faltando:
+        FALHAS_CACHE.incrementar(len(faltando), rota="recomendacoes")
+        payloads = await fonte.obter_payloads(faltando, CAMPOS_RECOMENDACOES)
+        amigos_payloads = await _compras_dos_amigos(fonte, payloads.values())
+        for cid, payload in payloads.items():
+            encontrados[cid] = _recomendacoes_cliente(cid, payload, amigos_payloads)
+            if fonte.versao is not None:
+                cache_respostas.guardar(("recomendacoes", cid), fonte.versao, encontrados[cid])
+        ITENS_CACHE.definir(len(cache_respostas))
+    return _resposta_lote(ids, encontrados)
+
+@app.get("/todos")
+async def obter_tudo(
+    request: Request,
+    after: Optional[int] = Query(None, description="Cursor: retorna clientes com id maior que este"),
+    limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description="Tamanho da pagina"),
+    formato: Optional[str] = Query(None, description="'ndjson' para streaming (ou Accept: application/x-ndjson)"),
+    fonte: FonteDados = Depends(fonte_versionada),
+):
+    """Retorna o resumo dos dados consolidados, com paginacao por cursor opcional."""
+    if _quer_ndjson(request, formato):
+        return await _resposta_ndjson(fonte, CAMPOS_PAYLOAD, after, limit, _resumo_todos)
+
+    async def montar():
+        itens, proximo = await _pagina(fonte, CAMPOS_PAYLOAD, after, limit)
+        return {
+            "total_clientes": len(itens),
+            "resumo": {str(cid): _resumo_todos(payload) for cid, payload in itens},
+            "proximo": proximo
         }
-    
-    return resultado
 
-@app.get("/health")
-def health_check():
-    """Verifica saude da API."""
+    return await _resposta_em_cache(fonte, ("todos", after, limit), montar)
+
+@app.post("/recarregar")
+async def recarregar():
+    """Forca a releitura do arquivo de dados consolidados."""
+    _, dados, _ = await _snapshot_json_async(forcar=True)
     return {
         "status": "ok",
-        "dados_disponiveis": os.path.exists("dados_consolidados.json")
+        "total_clientes": len(dados)
+    }
+
+@app.get("/health")
+async def health_check(completo: bool = Query(False, description="Checa tambem PostgreSQL, MongoDB e Neo4j")):
+    """Verifica saude da API (e, com completo=true, de todos os bancos)."""
+    redis_ok = False
+    # Mesmo recuo das rotas de dados: nao paga o timeout de um Redis que acabou de cair
+    if _redis_ativo():
+        try:
+            async with _limite_redis():
+                redis_ok = await resolver_geracao_async(obter_redis()) is not None
+        except redis.RedisError as exc:
+            _marcar_redis_indisponivel(exc)
+    saude = {
+        "status": "ok",
+        "redis_disponivel": redis_ok,
+        "dados_disponiveis": redis_ok or os.path.exists(ARQUIVO_DADOS)
     }
+    if completo:
+        # Drivers sincronos: roda fora do event loop, sobre as conexoes compartilhadas
+        saude["bancos"] = await run_in_threadpool(conexoes.verificar_saude)
+    return saude
+
+@app.get("/metrics")
+async def exportar_metricas(formato: Optional[str] = Query(None, description="'json' em vez do formato do Prometheus")):
+    """Metricas da API (latencia por rota, falhas do Redis) para o Prometheus."""
+    if formato == "json":
+        return registro_metricas.para_dict()
+    return Response(registro_metricas.prometheus(), media_type=MIDIA_PROMETHEUS)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,276 @@
+"""
+Benchmark das etapas quentes da integracao e da API com dados sinteticos.
+Roda sem os bancos reais: MongoDB via mongomock e Redis via fakeredis (ou um
+redis-server local com --redis-url). Para cada escala registra tempo, pico de
+memoria (tracemalloc) e vazao de cada etapa em um arquivo JSON, que pode ser
+comparado com o de outra versao:
+
+    python benchmark_integracao.py --escalas 1000 100000
+    python benchmark_integracao.py --escalas 1000000 --redis-url redis://localhost:6379/15
+    python benchmark_integracao.py --comparar resultados_antigos.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+import integracao
+from gerador_dados import (
+    SEMENTE_PADRAO,
+    gerar_amizades,
+    gerar_clientes,
+    gerar_compras,
+    gerar_interesses,
+    gerar_produtos,
+)
+from grafo import GrafoAmizades
+from recomendacao import calcular_recomendacoes
+import snapshot
+
+ESCALAS_PADRAO = (1000, 100000)
+ARQUIVO_RESULTADOS = "benchmark_resultados.json"
+
+
+class Medidor:
+    """Executa etapas medindo tempo e pico de memoria; acumula os resultados.
+
+    O tracemalloc deixa o codigo varias vezes mais lento, entao o tempo vem de
+    uma execucao sem ele e o pico de memoria de uma segunda execucao rastreada.
+    Etapas com efeitos colaterais (repetir=False) rodam uma unica vez, rastreada,
+    e o tempo dela ja inclui o custo do tracemalloc.
+    """
+
+    def __init__(self, memoria: bool = True):
+        self.memoria = memoria
+        self.resultados: List[Dict[str, Any]] = []
+
+    def medir(self, etapa: str, escala: int, funcao: Callable[[], Any], itens: Optional[int] = None,
+              repetir: bool = True):
+        gc.collect()
+        pico = None
+        if self.memoria and not repetir:
+            tracemalloc.start()
+            try:
+                inicio = time.perf_counter()
+                retorno = funcao()
+                duracao = time.perf_counter() - inicio
+                pico = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        else:
+            inicio = time.perf_counter()
+            retorno = funcao()
+            duracao = time.perf_counter() - inicio
+
+        if self.memoria and repetir:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                funcao()
+                pico = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        itens = escala if itens is None else itens
+        self.resultados.append({
+            "etapa": etapa,
+            "escala": escala,
+            "segundos": duracao,
+            "pico_memoria_bytes": pico,
+            "itens": itens,
+            "itens_por_s": itens / duracao if duracao > 0 else None,
+        })
+        memoria = f", pico {pico / 2**20:,.1f} MiB" if pico is not None else ""
+        print(f"[Benchmark] {etapa:<20} n={escala:<9} {duracao:8.3f}s ({itens / max(duracao, 1e-9):,.0f} itens/s{memoria})")
+        return retorno
+
+
+def fontes_sinteticas(n: int, semente: int = SEMENTE_PADRAO):
+    """Gera as tres fontes no formato de buscar_postgres/buscar_mongo/buscar_neo4j."""
+    m = max(50, n // 10)
+    dpg = {
+        "clientes": [integracao._linha_cliente(row) for row in gerar_clientes(n, semente)],
+        "compras": [integracao._linha_compra(row) for row in gerar_compras(n * 5, n, m, semente)],
+        "produtos": [integracao._linha_produto(row) for row in gerar_produtos(m, semente)],
+    }
+    arestas = list(gerar_amizades(n, semente=semente))
+    amigos = GrafoAmizades.de_arestas([a for a, _ in arestas], [b for _, b in arestas])
+    return dpg, amigos
+
+
+def _cliente_redis(redis_url: Optional[str]):
+    if redis_url:
+        import redis
+        return redis.Redis.from_url(redis_url, decode_responses=True), None
+    import fakeredis
+    servidor = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=servidor, decode_responses=True), servidor
+
+
+def _pool_api(redis_url: Optional[str], servidor):
+    if redis_url:
+        import redis.asyncio as aioredis
+        return aioredis.ConnectionPool.from_url(redis_url, decode_responses=True)
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(server=servidor, decode_responses=True).connection_pool
+
+
+async def _requisitar_recomendacoes(ids: List[int], concorrencia: int, redis_url: Optional[str], servidor):
+    """Uma rodada de requisicoes com pool e caches novos.
+
+    O pool assincrono (e o semaforo da API) ficam presos ao event loop de cada
+    asyncio.run, entao sao criados e fechados aqui dentro. Os caches de respostas
+    sao esvaziados para que toda rodada (a cronometrada e a rastreada) monte as
+    recomendacoes em vez de medir so acertos de cache.
+    """
+    import httpx
+    import api
+
+    api.cache_respostas.limpar()
+    api._redis_pool = _pool_api(redis_url, servidor)
+    try:
+        limite = asyncio.Semaphore(concorrencia)
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as http:
+            async def uma(cid):
+                async with limite:
+                    resposta = await http.get(f"/clientes/{cid}/recomendacoes")
+                    resposta.raise_for_status()
+            await asyncio.gather(*(uma(cid) for cid in ids))
+    finally:
+        await api.fechar_redis()
+
+
+def _gravar_redis(cache, consolidados):
+    """gravar_redis engole os erros e devolve False; aqui a falha derruba a etapa."""
+    if not integracao.gravar_redis(cache, consolidados):
+        raise RuntimeError("gravar_redis falhou; veja o aviso acima")
+
+
+def rodar_escala(medidor: Medidor, n: int, semente: int, redis_url: Optional[str], formato: str,
+                 amostra_api: int, concorrencia: int):
+    print(f"\n[Benchmark] Gerando {n} clientes sinteticos...")
+    dpg, amigos = fontes_sinteticas(n, semente)
+
+    # MongoDB em memoria, populado fora da medicao
+    try:
+        import mongomock
+        mongo = mongomock.MongoClient()
+        mongo[integracao.MONGO_DB][integracao.MONGO_COLLECTION].insert_many(gerar_interesses(n, semente))
+        original = integracao.obter_cliente_mongo
+        integracao.obter_cliente_mongo = lambda: mongo
+        try:
+            interesses = medidor.medir("buscar_mongo", n, integracao.buscar_mongo)
+        finally:
+            integracao.obter_cliente_mongo = original
+    except ImportError:
+        print("[AVISO] mongomock nao instalado; interesses gerados direto, sem medir buscar_mongo")
+        interesses = {doc["id_cliente"]: doc for doc in gerar_interesses(n, semente)}
+
+    consolidados = medidor.medir("consolidar", n, partial(integracao.consolidar, dpg, interesses, amigos))
+    # As linhas do PostgreSQL nao sao mais usadas; libera antes das proximas etapas
+    del dpg
+    medidor.medir("recomendacoes", n, lambda: calcular_recomendacoes(consolidados, grafo=amigos))
+
+    servidor = None
+    try:
+        cache, servidor = _cliente_redis(redis_url)
+        try:
+            medidor.medir("gravar_redis", n, lambda: _gravar_redis(cache, consolidados), repetir=False)
+        finally:
+            # A limpeza das geracoes antigas roda em outra thread e atrasaria a etapa seguinte
+            integracao.aguardar_expiracoes()
+    except ImportError:
+        print("[AVISO] fakeredis nao instalado e sem --redis-url; pulando gravar_redis e a API")
+        cache = None
+
+    with tempfile.TemporaryDirectory() as pasta:
+        original = integracao.ARQUIVO_JSON
+        integracao.ARQUIVO_JSON = os.path.join(pasta, "dados_consolidados.json")
+        try:
+            medidor.medir(f"salvar_json[{formato}]", n, lambda: integracao.salvar_json(consolidados, formato))
+        finally:
+            integracao.ARQUIVO_JSON = original
+
+    if cache is not None and amostra_api:
+        ids = random.Random(semente).sample(sorted(consolidados), min(amostra_api, n))
+        medidor.medir("api_recomendacoes", n,
+                      lambda: asyncio.run(_requisitar_recomendacoes(ids, concorrencia, redis_url, servidor)),
+                      len(ids))
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual: List[Dict[str, Any]], arquivo_anterior: str, tolerancia: float):
+    """Imprime a variacao de tempo e memoria em relacao a um resultado anterior."""
+    with open(arquivo_anterior, "r", encoding="utf-8") as f:
+        anterior = {(r["etapa"], r["escala"]): r for r in json.load(f)["resultados"]}
+    print(f"\n[Benchmark] Comparacao com '{arquivo_anterior}'")
+    regressoes = 0
+    for r in atual:
+        antes = anterior.get((r["etapa"], r["escala"]))
+        if not antes:
+            continue
+        razao = r["segundos"] / antes["segundos"] if antes["segundos"] else float("inf")
+        marca = "  <-- REGRESSAO" if razao > 1 + tolerancia else ""
+        regressoes += bool(marca)
+        memoria = ""
+        if r["pico_memoria_bytes"] and antes.get("pico_memoria_bytes"):
+            memoria = f", memoria {r['pico_memoria_bytes'] / antes['pico_memoria_bytes']:.2f}x"
+        print(f"  {r['etapa']:<20} n={r['escala']:<9} tempo {razao:.2f}x{memoria}{marca}")
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da integracao e da API com dados sinteticos")
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS_PADRAO),
+                        help="quantidades de clientes (ex.: 1000 100000 1000000)")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--redis-url", help="usa um redis-server real (ex.: redis://localhost:6379/15) em vez de fakeredis")
+    parser.add_argument("--formato", choices=snapshot.FORMATOS, default=snapshot.SNAPSHOT_FORMATO,
+                        help="formato do snapshot medido em salvar_json")
+    parser.add_argument("--amostra-api", type=int, default=1000, help="requisicoes de recomendacoes por escala")
+    parser.add_argument("--concorrencia", type=int, default=50, help="requisicoes simultaneas na API")
+    parser.add_argument("--sem-memoria", action="store_true",
+                        help="nao mede o pico de memoria (evita a segunda execucao de cada etapa)")
+    parser.add_argument("--saida", default=ARQUIVO_RESULTADOS, help=f"arquivo de resultados (padrao {ARQUIVO_RESULTADOS})")
+    parser.add_argument("--comparar", help="resultado anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="aumento de tempo aceito antes de acusar regressao")
+    args = parser.parse_args()
+
+    medidor = Medidor(memoria=not args.sem_memoria)
+    for escala in args.escalas:
+        rodar_escala(medidor, escala, args.semente, args.redis_url, args.formato,
+                     args.amostra_api, args.concorrencia)
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({
+            "gerado_em": datetime.now().isoformat(),
+            "commit": _commit_atual(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "semente": args.semente,
+            "redis": args.redis_url or "fakeredis",
+            "tracemalloc": medidor.memoria,
+            "resultados": medidor.resultados,
+        }, f, indent=2)
+    print(f"\n[Benchmark] Resultados salvos em '{args.saida}'")
+
+    if args.comparar:
+        regressoes = comparar(medidor.resultados, args.comparar, args.tolerancia)
+        raise SystemExit(1 if regressoes else 0)
@@ -0,0 +1,139 @@
+"""
+Compara os formatos de snapshot (tamanho, tempo de escrita e de leitura).
+Usa o snapshot atual ou gera dados sinteticos com gerador_dados:
+
+    python benchmark_snapshot.py
+    python benchmark_snapshot.py --clientes 50000 --formatos json orjson msgpack+zstd
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict
+
+from gerador_dados import (
+    SEMENTE_PADRAO,
+    gerar_amizades,
+    gerar_clientes,
+    gerar_compras,
+    gerar_interesses,
+    gerar_produtos,
+)
+from recomendacao import calcular_recomendacoes
+import snapshot
+
+ARQUIVO_DADOS = snapshot.caminho(os.getenv("ARQUIVO_DADOS", "dados_consolidados.json"))
+
+
+def dados_sinteticos(n: int, semente: int = SEMENTE_PADRAO) -> Dict[str, Dict[str, Any]]:
+    """Monta um snapshot no mesmo formato de integracao.salvar_json com n clientes."""
+    m = max(50, n // 10)
+    produtos = {
+        pid: {"id": pid, "produto": nome, "valor": valor, "quantidade": qtd, "tipo": tipo}
+        for pid, nome, valor, qtd, tipo in gerar_produtos(m, semente)
+    }
+    consolidados = {}
+    for cid, cpf, nome, endereco, cidade, uf, email in gerar_clientes(n, semente):
+        consolidados[cid] = {
+            "cliente": {"id": cid, "cpf": cpf, "nome": nome, "endereco": endereco,
+                        "cidade": cidade, "uf": uf, "email": email},
+            "interesses": {},
+            "amigos": [],
+            "compras": [],
+        }
+    for doc in gerar_interesses(n, semente):
+        consolidados[doc["id_cliente"]]["interesses"] = doc
+    amigos = defaultdict(list)
+    for pessoa, amigo in gerar_amizades(n, semente=semente):
+        amigos[pessoa].append(amigo)
+    for cid, lista in amigos.items():
+        consolidados[cid]["amigos"] = lista
+    for compra_id, pid, data, cid in gerar_compras(n * 5, n, m, semente):
+        consolidados[cid]["compras"].append({
+            "id": compra_id, "id_produto": pid, "data": data.isoformat(),
+            "id_cliente": cid, "produto": produtos[pid],
+        })
+    calcular_recomendacoes(consolidados)
+    return {str(cid): payload for cid, payload in consolidados.items()}
+
+
+def _melhor_tempo(funcao, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def medir(dados: Dict[str, Any], formatos, repeticoes: int):
+    """Para cada formato: (nome, bytes, escrita, leitura completa, abrir e ler um cliente)."""
+    resultados = []
+    cliente = next(iter(dados), None)
+    with tempfile.TemporaryDirectory() as pasta:
+        base = os.path.join(pasta, "snapshot.json")
+
+        # Linha de referencia: o que salvar_json/json.load faziam antes
+        def escrever_legado():
+            with open(base, "w", encoding="utf-8") as f:
+                json.dump(dados, f, ensure_ascii=False, indent=2)
+
+        def ler_legado():
+            with open(base, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        escrita = _melhor_tempo(escrever_legado, repeticoes)
+        leitura = _melhor_tempo(ler_legado, repeticoes)
+        um = _melhor_tempo(lambda: ler_legado().get(cliente), repeticoes)
+        resultados.append(("json (json.load)", os.path.getsize(base), escrita, leitura, um))
+
+        for formato in formatos:
+            arquivo = snapshot.caminho(base, formato)
+            try:
+                escrita = _melhor_tempo(lambda: snapshot.salvar(arquivo, dados, formato), repeticoes)
+            except RuntimeError as exc:
+                print(f"[AVISO] {formato} ignorado: {exc}")
+                continue
+            # dict() forca a decodificacao completa tambem no formato indexado
+            leitura = _melhor_tempo(lambda: dict(snapshot.carregar(arquivo)), repeticoes)
+            um = _melhor_tempo(lambda: snapshot.carregar(arquivo).get(cliente), repeticoes)
+            resultados.append((formato, os.path.getsize(arquivo), escrita, leitura, um))
+    return resultados
+
+
+def imprimir(resultados):
+    _, tamanho_ref, escrita_ref, leitura_ref, _ = resultados[0]
+    print(f"{'formato':<18} {'tamanho':>14} {'%':>6} {'escrita':>10} {'leitura':>10} {'x leitura':>10} {'1 cliente':>10}")
+    for formato, tamanho, escrita, leitura, um in resultados:
+        print(f"{formato:<18} {tamanho:>14,} {100 * tamanho / tamanho_ref:>5.1f}% "
+              f"{escrita * 1000:>8.1f}ms {leitura * 1000:>8.1f}ms {leitura_ref / leitura:>9.1f}x {um * 1000:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara os formatos de snapshot dos dados consolidados")
+    parser.add_argument("--clientes", type=int, default=0,
+                        help=f"gera N clientes sinteticos (padrao: usa '{ARQUIVO_DADOS}')")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--formatos", nargs="+", choices=snapshot.FORMATOS, default=list(snapshot.FORMATOS))
+    parser.add_argument("--repeticoes", type=int, default=3, help="mede o melhor de N execucoes")
+    parser.add_argument("--saida", help="grava os resultados tambem em um arquivo JSON")
+    args = parser.parse_args()
+
+    if args.clientes:
+        print(f"Gerando {args.clientes} clientes sinteticos...")
+        dados = dados_sinteticos(args.clientes, args.semente)
+    else:
+        dados = dict(snapshot.carregar(ARQUIVO_DADOS))
+    print(f"{len(dados)} clientes, melhor de {args.repeticoes} execucao(oes)\n")
+
+    resultados = medir(dados, args.formatos, args.repeticoes)
+    imprimir(resultados)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump([
+                {"formato": formato, "bytes": tamanho, "escrita_s": escrita, "leitura_s": leitura,
+                 "um_cliente_s": um}
+                for formato, tamanho, escrita, leitura, um in resultados
+            ], f, indent=2)
@@ -0,0 +1,75 @@
+"""
+Nomes das chaves do Redis compartilhados pela integracao, API e visualizador.
+Cada execucao da integracao grava em uma geracao nova (v{n}:cliente:*) e so no
+final troca o ponteiro geracao:atual, com um unico SET atomico.
+
+Junto com o ponteiro vai a versao publicada ("<geracao>.<epoch em ms>"), trocada
+em toda execucao (inclusive nas incrementais, que regravam a mesma geracao). A
+API usa a versao como ETag/Last-Modified e, ao receber o anuncio no canal
+snapshot:atualizado, limpa os caches locais de respostas.
+"""
+import time
+from typing import Optional, Tuple
+
+# Ponteiro para a geracao publicada e contador usado para criar novas geracoes
+CHAVE_GERACAO_ATUAL = "geracao:atual"
+CHAVE_GERACAO_SEQ = "geracao:seq"
+CHAVE_VERSAO = "geracao:versao"
+# Canal em que a integracao anuncia cada versao publicada (mensagem = versao)
+CANAL_SNAPSHOT = "snapshot:atualizado"
+
+
+def prefixo(geracao: int) -> str:
+    """Prefixo do namespace de uma geracao, ex.: 'v3:'."""
+    return f"v{geracao}:"
+
+
+def chave_cliente(geracao: int, cid) -> str:
+    return f"{prefixo(geracao)}cliente:{cid}"
+
+
+def chave_indice_clientes(geracao: int) -> str:
+    """Sorted set com os ids da geracao (score = id), usado na paginacao por cursor."""
+    return f"{prefixo(geracao)}clientes"
+
+
+def geracao_da_chave(chave: str) -> Optional[int]:
+    """Extrai o numero da geracao de uma chave 'v{n}:...'; None se nao for versionada."""
+    if not chave.startswith("v"):
+        return None
+    numero = chave[1:].split(":", 1)[0]
+    return int(numero) if numero.isdigit() else None
+
+
+def resolver_geracao(r) -> Optional[int]:
+    """Retorna a geracao publicada ou None se a integracao ainda nao gravou nada."""
+    valor = r.get(CHAVE_GERACAO_ATUAL)
+    return int(valor) if valor is not None else None
+
+
+async def resolver_geracao_async(r) -> Optional[int]:
+    """Mesmo que resolver_geracao, para clientes redis.asyncio."""
+    valor = await r.get(CHAVE_GERACAO_ATUAL)
+    return int(valor) if valor is not None else None
+
+
+def nova_versao(geracao: int) -> str:
+    """Versao de uma publicacao: '<geracao>.<epoch em ms>'."""
+    return f"{geracao}.{time.time_ns() // 1_000_000}"
+
+
+def instante_da_versao(versao: str) -> Optional[float]:
+    """Epoch (segundos) em que a versao foi publicada; None se a versao nao tiver o instante."""
+    _, _, milis = versao.partition(".")
+    return int(milis) / 1000 if milis.isdigit() else None
+
+
+async def resolver_versao_async(r) -> Tuple[Optional[int], Optional[str]]:
+    """Retorna (geracao, versao) publicadas em uma unica ida ao Redis.
+
+    Geracoes gravadas antes da versao existir usam o proprio numero da geracao.
+    """
+    geracao, versao = await r.mget(CHAVE_GERACAO_ATUAL, CHAVE_VERSAO)
+    if geracao is None:
+        return None, None
+    return int(geracao), versao or geracao
@@ -0,0 +1,219 @@
+"""
+Conexoes compartilhadas com PostgreSQL, MongoDB, Neo4j e Redis.
+
+Cada cliente eh criado na primeira vez que eh pedido e reaproveitado pelo resto
+do processo: um pool de conexoes do psycopg2, um unico MongoClient e um unico
+driver do Neo4j (ambos ja mantem pool interno) e um ConnectionPool do Redis.
+Tudo eh fechado no atexit. Depois de um fork (pool de processos da integracao
+particionada) o filho abandona o que herdou e cria as proprias conexoes.
+
+Os drivers sao importados so quando usados, entao a API (que so fala com o
+Redis) nao precisa de pymongo nem do neo4j instalados.
+"""
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+PG_DSN = os.getenv("PG_DSN", "dbname=postgres user=postgres password=postgres host=localhost port=5432")
+# Conexoes do pool do PostgreSQL; quem pede alem do maximo espera uma ser devolvida
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "8"))
+# Conexoes presas ao mesmo tempo pela leitura em streaming da integracao (um
+# cursor server-side por tabela); um pool menor que isso travaria esperando vaga
+PG_POOL_MINIMO = 3
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_POOL_MAX = int(os.getenv("MONGO_POOL_MAX", "50"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j12345")
+NEO4J_POOL_MAX = int(os.getenv("NEO4J_POOL_MAX", "50"))
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+REDIS_POOL_MAX = int(os.getenv("REDIS_POOL_MAX", "50"))
+
+BANCOS = ("PostgreSQL", "MongoDB", "Neo4j", "Redis")
+
+_lock = threading.RLock()
+_pg_pool = None
+_pg_vagas: Optional[threading.BoundedSemaphore] = None
+# Semaforo de onde cada conexao emprestada saiu, para devolver a vaga certa
+_vagas_por_conexao: Dict[int, threading.BoundedSemaphore] = {}
+_mongo = None
+_neo4j = None
+_redis_pool = None
+# Objetos herdados de um fork: guardados (nunca fechados nem coletados) porque os
+# sockets ainda pertencem ao processo pai
+_herdados: List[Any] = []
+
+
+def parametros_redis() -> Dict[str, Any]:
+    """Endereco do Redis, tambem usado pela API para montar o pool assincrono."""
+    return {"host": REDIS_HOST, "port": REDIS_PORT, "db": REDIS_DB, "decode_responses": True}
+
+
+def _pool_postgres():
+    global _pg_pool, _pg_vagas
+    if _pg_pool is None:
+        with _lock:
+            if _pg_pool is None:
+                if PG_POOL_MAX < PG_POOL_MINIMO:
+                    raise ValueError(f"PG_POOL_MAX={PG_POOL_MAX} eh pequeno demais; use pelo menos {PG_POOL_MINIMO}")
+                from psycopg2.pool import ThreadedConnectionPool
+                _pg_pool = ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, PG_DSN)
+                _pg_vagas = threading.BoundedSemaphore(PG_POOL_MAX)
+    return _pg_pool
+
+
+def emprestar_postgres():
+    """Pega uma conexao do pool; devolva com devolver_postgres (ou use conexao_postgres)."""
+    pool = _pool_postgres()
+    vagas = _pg_vagas
+    # O pool do psycopg2 da erro quando esgota; o semaforo faz esperar em vez disso
+    vagas.acquire()
+    try:
+        conn = pool.getconn()
+    except Exception:
+        vagas.release()
+        raise
+    _vagas_por_conexao[id(conn)] = vagas
+    return conn
+
+
+def devolver_postgres(conn):
+    """Devolve ao pool; transacao aberta eh desfeita e conexao quebrada eh descartada.
+
+    Se fechar() rodou enquanto ela estava emprestada, o pool de origem nao existe
+    mais: a conexao eh so fechada, sem tocar no pool novo. Conexoes herdadas de um
+    fork nao sao reconhecidas e ficam intocadas (o socket eh do processo pai).
+    """
+    vagas = _vagas_por_conexao.pop(id(conn), None) if conn is not None else None
+    if vagas is None:
+        return
+    pool = _pg_pool
+    try:
+        if pool is not None and vagas is _pg_vagas:
+            pool.putconn(conn, close=bool(conn.closed))
+        elif not conn.closed:
+            conn.close()
+    finally:
+        vagas.release()
+
+
+@contextmanager
+def conexao_postgres() -> Iterator[Any]:
+    """Conexao do pool com commit no fim do bloco (rollback se der erro), como `with conn:`."""
+    conn = emprestar_postgres()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        devolver_postgres(conn)
+
+
+def cliente_mongo():
+    """MongoClient unico do processo (thread-safe, com pool proprio)."""
+    global _mongo
+    if _mongo is None:
+        with _lock:
+            if _mongo is None:
+                from pymongo import MongoClient
+                _mongo = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_MAX,
+                                     serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+    return _mongo
+
+
+def driver_neo4j():
+    """Driver unico do Neo4j (thread-safe; abra uma session por uso)."""
+    global _neo4j
+    if _neo4j is None:
+        with _lock:
+            if _neo4j is None:
+                from neo4j import GraphDatabase
+                _neo4j = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD),
+                                              max_connection_pool_size=NEO4J_POOL_MAX)
+    return _neo4j
+
+
+def cliente_redis():
+    """Cliente Redis sincrono sobre o ConnectionPool compartilhado."""
+    global _redis_pool
+    import redis
+    if _redis_pool is None:
+        with _lock:
+            if _redis_pool is None:
+                _redis_pool = redis.ConnectionPool(max_connections=REDIS_POOL_MAX, **parametros_redis())
+    return redis.Redis(connection_pool=_redis_pool)
+
+
+def _checar_postgres():
+    with conexao_postgres() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+
+
+_CHECAGENS: Dict[str, Callable[[], Any]] = {
+    "PostgreSQL": _checar_postgres,
+    "MongoDB": lambda: cliente_mongo().admin.command("ping"),
+    "Neo4j": lambda: driver_neo4j().verify_connectivity(),
+    "Redis": lambda: cliente_redis().ping(),
+}
+
+
+def verificar(banco: str) -> Dict[str, Any]:
+    """Faz uma ida e volta ao banco: {"ok", "ms", "erro"}."""
+    inicio = time.perf_counter()
+    try:
+        _CHECAGENS[banco]()
+        return {"ok": True, "ms": (time.perf_counter() - inicio) * 1000, "erro": None}
+    except Exception as exc:
+        return {"ok": False, "ms": (time.perf_counter() - inicio) * 1000, "erro": str(exc)}
+
+
+def verificar_saude(bancos=BANCOS) -> Dict[str, Dict[str, Any]]:
+    """Checa os bancos informados (todos por padrao) usando as conexoes compartilhadas."""
+    return {banco: verificar(banco) for banco in bancos}
+
+
+def fechar():
+    """Fecha todas as conexoes abertas (registrado no atexit)."""
+    global _pg_pool, _pg_vagas, _mongo, _neo4j, _redis_pool
+    with _lock:
+        pg, mongo, neo4j, pool_redis = _pg_pool, _mongo, _neo4j, _redis_pool
+        _pg_pool = _pg_vagas = _mongo = _neo4j = _redis_pool = None
+    for nome, fechar_cliente in (
+        ("PostgreSQL", pg and pg.closeall),
+        ("MongoDB", mongo and mongo.close),
+        ("Neo4j", neo4j and neo4j.close),
+        ("Redis", pool_redis and pool_redis.disconnect),
+    ):
+        if not fechar_cliente:
+            continue
+        try:
+            fechar_cliente()
+        except Exception as exc:
+            print(f"[AVISO] Falha ao fechar conexoes do {nome}: {exc}")
+
+
+def _abandonar_herdadas():
+    """Roda no filho logo apos o fork: esquece as conexoes do pai sem fecha-las."""
+    global _lock, _pg_pool, _pg_vagas, _vagas_por_conexao, _mongo, _neo4j, _redis_pool
+    _herdados.extend(c for c in (_pg_pool, _mongo, _neo4j, _redis_pool) if c is not None)
+    _pg_pool = _pg_vagas = _mongo = _neo4j = _redis_pool = None
+    _vagas_por_conexao = {}
+    # O lock pode ter sido copiado adquirido por outra thread do pai
+    _lock = threading.RLock()
+
+
+atexit.register(fechar)
+if hasattr(os, "register_at_fork"):  # nao existe no Windows, onde nao ha fork
+    os.register_at_fork(after_in_child=_abandonar_herdadas)
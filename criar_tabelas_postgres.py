@@ -2,13 +2,10 @@
 Script para criar as tabelas no PostgreSQL.
 Execute este script antes de usar seed_postgres.sql
 """
-import psycopg2
-import os
-
-PG_DSN = os.getenv("PG_DSN", "dbname=postgres user=postgres password=postgres host=localhost port=5432")
+import conexoes
 
 def criar_tabelas():
-    conn = psycopg2.connect(PG_DSN)
+    conn = conexoes.emprestar_postgres()
     cur = conn.cursor()
     
     # Drops anteriores (opcional - comentar se quiser preservar dados)
@@ -57,9 +54,13 @@ def criar_tabelas():
     """)
     print("[PostgreSQL] Tabela 'compras' criada")
     
+    # Indice para buscar compras por cliente (extracao filtrada/particionada)
+    cur.execute("CREATE INDEX compras_id_cliente_idx ON compras (id_cliente)")
+    print("[PostgreSQL] Indice 'compras_id_cliente_idx' criado")
+    
     conn.commit()
     cur.close()
-    conn.close()
+    conexoes.devolver_postgres(conn)
     print("[PostgreSQL] Tabelas criadas com sucesso!")
 
 if __name__ == "__main__":
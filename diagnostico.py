@@ -5,26 +5,24 @@ Testa cada banco individualmente e fornece recomendacoes.
 import os
 import sys
 
+import conexoes
+
 def testar_postgres():
     print("\n" + "="*60)
     print("Testando PostgreSQL...")
     print("="*60)
     try:
-        import psycopg2
-        pg_dsn = os.getenv("PG_DSN", "dbname=postgres user=postgres password=postgres host=localhost port=5432")
-        conn = psycopg2.connect(pg_dsn)
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM clientes;")
-        total = cur.fetchone()[0]
-        cur.close()
-        conn.close()
+        with conexoes.conexao_postgres() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM clientes;")
+                total = cur.fetchone()[0]
         print(f"✓ PostgreSQL conectado com sucesso!")
         print(f"  Total de clientes: {total}")
         return True
     except Exception as e:
         print(f"✗ Erro ao conectar ao PostgreSQL: {e}")
         print("  Certifique-se de que PostgreSQL esta rodando")
-        print("  Verifique as credenciais no arquivo integracao.py")
+        print("  Verifique o PG_DSN (padrao em conexoes.py)")
         return False
 
 def testar_mongo():
@@ -32,18 +30,15 @@ def testar_mongo():
     print("Testando MongoDB...")
     print("="*60)
     try:
-        from pymongo import MongoClient
-        mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
         mongo_db = os.getenv("MONGO_DB", "bd2")
         mongo_coll = os.getenv("MONGO_COLLECTION", "interesses")
         
-        cliente = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        cliente = conexoes.cliente_mongo()
         # Testa a conexao
-        cliente.admin.command('ismaster')
+        cliente.admin.command('ping')
         
         colecao = cliente[mongo_db][mongo_coll]
         total = colecao.count_documents({})
-        cliente.close()
         
         print(f"✓ MongoDB conectado com sucesso!")
         print(f"  Total de documentos em '{mongo_coll}': {total}")
@@ -51,7 +46,7 @@ def testar_mongo():
     except Exception as e:
         print(f"✗ Erro ao conectar ao MongoDB: {e}")
         print("  Certifique-se de que MongoDB esta rodando")
-        print("  URI padrao: mongodb://localhost:27017")
+        print(f"  URI: {conexoes.MONGO_URI}")
         return False
 
 def testar_neo4j():
@@ -59,23 +54,16 @@ def testar_neo4j():
     print("Testando Neo4j...")
     print("="*60)
     try:
-        from neo4j import GraphDatabase
-        neo4j_uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        neo4j_user = os.getenv("NEO4J_USER", "neo4j")
-        neo4j_pass = os.getenv("NEO4J_PASSWORD", "neo4j")
-        
-        driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_pass))
+        driver = conexoes.driver_neo4j()
         
         with driver.session() as session:
             resultado = session.run("MATCH (p:Pessoa) RETURN COUNT(p) as total")
             total = resultado.single()["total"] if resultado else 0
         
-        driver.close()
-        
         print(f"✓ Neo4j conectado com sucesso!")
         print(f"  Total de nodos Pessoa: {total}")
-        print(f"  URI: {neo4j_uri}")
-        print(f"  Usuario: {neo4j_user}")
+        print(f"  URI: {conexoes.NEO4J_URI}")
+        print(f"  Usuario: {conexoes.NEO4J_USER}")
         return True
     except Exception as e:
         print(f"✗ Erro ao conectar ao Neo4j: {e}")
@@ -98,24 +86,24 @@ def testar_redis():
     print("Testando Redis...")
     print("="*60)
     try:
-        import redis
-        redis_host = os.getenv("REDIS_HOST", "localhost")
-        redis_port = int(os.getenv("REDIS_PORT", "6379"))
-        redis_db = int(os.getenv("REDIS_DB", "0"))
-        
-        r = redis.Redis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+        r = conexoes.cliente_redis()
         r.ping()
         
-        total_keys = len(r.keys("cliente:*"))
+        from chaves_redis import prefixo, resolver_geracao
+        geracao = resolver_geracao(r)
         
         print(f"✓ Redis conectado com sucesso!")
-        print(f"  Host: {redis_host}:{redis_port}")
-        print(f"  Chaves 'cliente:*': {total_keys}")
+        print(f"  Host: {conexoes.REDIS_HOST}:{conexoes.REDIS_PORT}")
+        if geracao is None:
+            print("  Nenhuma geracao publicada (execute integracao.py)")
+        else:
+            total_clientes = r.hget(f"{prefixo(geracao)}meta", "total_clientes")
+            print(f"  Geracao atual: v{geracao} ({total_clientes} clientes)")
         return True
     except Exception as e:
         print(f"✗ Erro ao conectar ao Redis: {e}")
         print("  Certifique-se de que Redis esta rodando")
-        print("  URI padrao: localhost:6379")
+        print(f"  Host: {conexoes.REDIS_HOST}:{conexoes.REDIS_PORT}")
         return False
 
 def main():
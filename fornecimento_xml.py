@@ -0,0 +1,167 @@
+"""
+Integra o arquivo Fornecimento.xml com as tabelas Peca, Fornecedor e Projeto
+(esquema em postcriatab.sql) e carrega o resultado na tabela fornecimento.
+
+O XML eh lido em streaming com iterparse: cada <row> eh convertida, juntada com
+os dicionarios de referencia e descartada, entao a memoria depende so do
+tamanho das tabelas de referencia, nao do arquivo. A carga usa COPY em uma
+tabela temporaria seguida de um upsert pelo codigo.
+"""
+import argparse
+import os
+import time
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+import conexoes
+from seed_postgres import carregar_tabela
+
+ARQUIVO_FORNECIMENTO = os.getenv("ARQUIVO_FORNECIMENTO", "Fornecimento.xml")
+
+COLUNAS_FORNECIMENTO = ("codigo", "cod_fornec", "cod_peca", "cod_proj", "quantidade", "valor")
+# Conversao de cada campo de <row>; campos ausentes ficam None
+CONVERSORES = {
+    "codigo": int,
+    "cod_fornec": int,
+    "cod_peca": int,
+    "cod_proj": int,
+    "quantidade": int,
+    "valor": Decimal,
+}
+
+SQL_PECAS = "SELECT cod_peca, pnome, cor, peso, cdade FROM peca"
+SQL_FORNECEDORES = "SELECT cod_fornec, fnome, status, cidade FROM fornecedor"
+SQL_PROJETOS = "SELECT cod_proj, jnome, cidade FROM projeto"
+
+SQL_UPSERT = """
+    INSERT INTO fornecimento (codigo, cod_fornec, cod_peca, cod_proj, quantidade, valor)
+    -- Se o XML repetir um codigo, vale a ultima ocorrencia
+    SELECT DISTINCT ON (codigo) codigo, cod_fornec, cod_peca, cod_proj, quantidade, valor
+    FROM fornecimento_carga
+    ORDER BY codigo, ctid DESC
+    ON CONFLICT (codigo) DO UPDATE SET
+        cod_fornec = EXCLUDED.cod_fornec,
+        cod_peca = EXCLUDED.cod_peca,
+        cod_proj = EXCLUDED.cod_proj,
+        quantidade = EXCLUDED.quantidade,
+        valor = EXCLUDED.valor
+"""
+# Codigos vindos do XML nao passam pela sequence do serial; evita colisao nos proximos INSERTs
+SQL_AJUSTAR_SEQUENCIA = """
+    SELECT setval(pg_get_serial_sequence('fornecimento', 'codigo'),
+                  GREATEST((SELECT MAX(codigo) FROM fornecimento), 1))
+"""
+
+
+def ler_fornecimentos(arquivo: str = ARQUIVO_FORNECIMENTO) -> Iterator[Dict[str, Any]]:
+    """Gera um dict por <row> do XML, liberando cada elemento depois de lido."""
+    eventos = ET.iterparse(arquivo, events=("start", "end"))
+    _, raiz = next(eventos)
+    for evento, elem in eventos:
+        if evento != "end" or elem.tag != "row":
+            continue
+        linha = {}
+        for campo in elem:
+            conversor = CONVERSORES.get(campo.tag)
+            if conversor is not None:
+                texto = (campo.text or "").strip()
+                linha[campo.tag] = conversor(texto) if texto else None
+        yield linha
+        # Sem isso a raiz guardaria todas as <row> ja lidas
+        elem.clear()
+        raiz.clear()
+
+
+def carregar_referencias(cur) -> Tuple[Dict[int, Dict], Dict[int, Dict], Dict[int, Dict]]:
+    """Le Peca, Fornecedor e Projeto para dicionarios indexados pelo codigo."""
+    cur.execute(SQL_PECAS)
+    pecas = {int(cod): {"pnome": pnome, "cor": cor, "peso": peso, "cidade": cidade}
+             for cod, pnome, cor, peso, cidade in cur}
+    cur.execute(SQL_FORNECEDORES)
+    fornecedores = {int(cod): {"fnome": fnome, "status": status, "cidade": cidade}
+                    for cod, fnome, status, cidade in cur}
+    cur.execute(SQL_PROJETOS)
+    projetos = {int(cod): {"jnome": jnome, "cidade": cidade} for cod, jnome, cidade in cur}
+    return pecas, fornecedores, projetos
+
+
+class Juncao:
+    """Junta cada linha do XML com as referencias; conta as que nao casam.
+
+    Linhas com peca, fornecedor ou projeto inexistente violariam as chaves
+    estrangeiras de fornecimento, entao sao descartadas (e contadas).
+    """
+
+    def __init__(self, pecas, fornecedores, projetos):
+        self.pecas = pecas
+        self.fornecedores = fornecedores
+        self.projetos = projetos
+        self.lidas = 0
+        self.rejeitadas = 0
+
+    def juntar(self, linhas: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for linha in linhas:
+            self.lidas += 1
+            peca = self.pecas.get(linha.get("cod_peca"))
+            fornecedor = self.fornecedores.get(linha.get("cod_fornec"))
+            projeto = self.projetos.get(linha.get("cod_proj"))
+            if linha.get("codigo") is None or peca is None or fornecedor is None or projeto is None:
+                self.rejeitadas += 1
+                if self.rejeitadas <= 5:
+                    print(f"[AVISO] Fornecimento sem correspondencia, ignorado: {linha}")
+                continue
+            yield {**linha, "peca": peca, "fornecedor": fornecedor, "projeto": projeto}
+
+
+def _exibir(linhas: Iterable[Dict[str, Any]], limite: int) -> Iterator[Dict[str, Any]]:
+    """Repassa as linhas e imprime as primeiras, como o relatorio original."""
+    for i, linha in enumerate(linhas):
+        if i < limite:
+            print(f"  #{linha['codigo']}: {linha['fornecedor']['fnome']} -> "
+                  f"{linha['peca']['pnome']} ({linha['peca']['cor']}) -> {linha['projeto']['jnome']} | "
+                  f"qtd {linha['quantidade']}, R$ {linha['valor']}")
+        yield linha
+
+
+def integrar_fornecimento(arquivo: str = ARQUIVO_FORNECIMENTO, usar_copy: bool = True, exibir: int = 10):
+    """Le o XML em streaming, junta com as referencias e carrega em fornecimento."""
+    conn = conexoes.emprestar_postgres()
+    cur = conn.cursor()
+    inicio = time.perf_counter()
+    try:
+        juncao = Juncao(*carregar_referencias(cur))
+        print(f"[Fornecimento] Referencias: {len(juncao.pecas)} pecas, "
+              f"{len(juncao.fornecedores)} fornecedores, {len(juncao.projetos)} projetos")
+
+        cur.execute("CREATE TEMP TABLE fornecimento_carga "
+                    "(LIKE fornecimento INCLUDING DEFAULTS) ON COMMIT DROP")
+        linhas = _exibir(juncao.juntar(ler_fornecimentos(arquivo)), exibir)
+        carregar_tabela(
+            cur, "fornecimento_carga", COLUNAS_FORNECIMENTO,
+            (tuple(linha[c] for c in COLUNAS_FORNECIMENTO) for linha in linhas),
+            usar_copy,
+        )
+        cur.execute(SQL_UPSERT)
+        gravadas = cur.rowcount
+        cur.execute(SQL_AJUSTAR_SEQUENCIA)
+        conn.commit()
+
+        print(f"[Fornecimento] {juncao.lidas} linhas lidas de '{arquivo}', {gravadas} gravadas, "
+              f"{juncao.rejeitadas} rejeitadas em {time.perf_counter() - inicio:.2f}s")
+        return gravadas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conexoes.devolver_postgres(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Integra Fornecimento.xml com Peca/Fornecedor/Projeto")
+    parser.add_argument("--arquivo", default=ARQUIVO_FORNECIMENTO, help="XML no formato <fornecimento><row>...")
+    parser.add_argument("--sem-copy", action="store_true", help="usa execute_values em vez de COPY")
+    parser.add_argument("--exibir", type=int, default=10, help="quantas linhas juntadas imprimir")
+    args = parser.parse_args()
+    integrar_fornecimento(args.arquivo, usar_copy=not args.sem_copy, exibir=args.exibir)
@@ -0,0 +1,170 @@
+"""
+Gerador de dados sinteticos para testes de carga.
+Mesma semente => mesmos dados; cada tabela usa seu proprio gerador aleatorio,
+entao clientes, produtos e compras continuam consistentes entre si mesmo que
+sejam gerados separadamente (ex.: por seeds de bancos diferentes).
+"""
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+from typing import Iterator, List, Tuple
+
+NOMES = [
+    "Ana", "Bruno", "Carlos", "Diana", "Eduardo", "Fernanda", "Gabriel", "Helena",
+    "Igor", "Julia", "Lucas", "Mariana", "Nicolas", "Olivia", "Pedro", "Rafaela",
+    "Sofia", "Thiago", "Vitoria", "Yuri",
+]
+SOBRENOMES = [
+    "Silva", "Costa", "Oliveira", "Ferreira", "Morales", "Lima", "Souza", "Pereira",
+    "Almeida", "Rocha", "Gomes", "Martins", "Barbosa", "Ribeiro", "Carvalho",
+]
+# (cidade, uf, peso relativo da populacao)
+CIDADES = [
+    ("Sao Paulo", "SP", 12.3), ("Rio de Janeiro", "RJ", 6.7), ("Brasilia", "DF", 3.0),
+    ("Salvador", "BA", 2.9), ("Fortaleza", "CE", 2.7), ("Belo Horizonte", "MG", 2.5),
+    ("Manaus", "AM", 2.2), ("Curitiba", "PR", 1.9), ("Recife", "PE", 1.6),
+    ("Porto Alegre", "RS", 1.5), ("Chapeco", "SC", 0.2), ("Passo Fundo", "RS", 0.2),
+]
+# tipo -> (nomes base, preco mediano)
+CATALOGO = {
+    "eletronico": (["Notebook", "Teclado Mecanico", "Mouse Wireless", "Fone Bluetooth", "Monitor", "Webcam"], 600.0),
+    "livro": (["Livro Clean Code", "Livro Python", "Livro Banco de Dados", "Romance", "HQ"], 70.0),
+    "esportes": (["Bola de Basquete", "Bola de Futebol", "Tenis de Corrida", "Raquete", "Bicicleta"], 180.0),
+    "midia": (["Filme DVD", "Serie Blu-ray", "Album Vinil", "Assinatura Streaming"], 50.0),
+    "mobiliario": (["Cadeira Gamer", "Mesa de Escritorio", "Estante", "Poltrona"], 800.0),
+    "games": (["Console", "Jogo de Aventura", "Controle", "Headset Gamer"], 300.0),
+}
+# Interesses livres + tipos e palavras do catalogo, para as recomendacoes casarem
+INTERESSES = [
+    "tecnologia", "programacao", "leitura", "games", "esportes", "basquete", "fitness",
+    "design", "cinema", "streaming", "musica", "artes", "negocios", "viagens",
+    "eletronico", "livro", "midia", "mobiliario", "notebook", "bola", "fone", "console",
+]
+RESUMOS = [
+    "Profissional de TI", "Atleta amador", "Designer grafico", "Streamer de games",
+    "Cinefilo", "Empreendedor", "Estudante", "Professor", "Leitor assiduo",
+]
+MARCAS = ["Alfa", "Beta", "Gama", "Delta", "Omega", "Prime", "Nova", "Max"]
+
+SEMENTE_PADRAO = 42
+
+
+def _rng(semente: int, tabela: str) -> random.Random:
+    return random.Random(f"{semente}-{tabela}")
+
+
+def _pesos_zipf(n: int, s: float = 1.1) -> List[float]:
+    """Pesos acumulados de uma distribuicao de Zipf (poucos itens muito populares)."""
+    return list(accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+
+def gerar_clientes(n: int, semente: int = SEMENTE_PADRAO) -> Iterator[Tuple]:
+    """Gera (id, cpf, nome, endereco, cidade, uf, email) para ids 1..n."""
+    rnd = _rng(semente, "clientes")
+    pesos_cidades = list(accumulate(c[2] for c in CIDADES))
+    for cid in range(1, n + 1):
+        nome = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}"
+        cidade, uf, _ = rnd.choices(CIDADES, cum_weights=pesos_cidades)[0]
+        usuario = nome.lower().replace(" ", ".")
+        yield (
+            cid,
+            f"{cid:011d}",
+            nome,
+            f"Rua {rnd.randint(1, 500)}, {rnd.randint(1, 3000)}",
+            cidade,
+            uf,
+            f"{usuario}{cid}@email.com",
+        )
+
+
+def gerar_produtos(m: int, semente: int = SEMENTE_PADRAO) -> Iterator[Tuple]:
+    """Gera (id, produto, valor, quantidade, tipo) para ids 1..m; precos log-normais por tipo."""
+    rnd = _rng(semente, "produtos")
+    tipos = list(CATALOGO)
+    for pid in range(1, m + 1):
+        tipo = rnd.choice(tipos)
+        nomes, mediana = CATALOGO[tipo]
+        valor = round(mediana * rnd.lognormvariate(0, 0.5), 2)
+        yield (
+            pid,
+            f"{rnd.choice(nomes)} {rnd.choice(MARCAS)} {pid}",
+            min(valor, 99999999.99),
+            rnd.randint(0, 500),
+            tipo,
+        )
+
+
+def gerar_compras(k: int, n_clientes: int, m_produtos: int, semente: int = SEMENTE_PADRAO,
+                  inicio: date = date(2023, 1, 1), dias: int = 730) -> Iterator[Tuple]:
+    """Gera (id, id_produto, data, id_cliente) para ids 1..k.
+
+    Produtos seguem Zipf (alguns campeoes de venda) e a atividade dos clientes eh
+    log-normal (a maioria compra pouco, alguns compram muito).
+    """
+    rnd = _rng(semente, "compras")
+    pesos_produtos = _pesos_zipf(m_produtos)
+    pesos_clientes = list(accumulate(rnd.lognormvariate(0, 1) for _ in range(n_clientes)))
+    # Embaralha a popularidade para os ids baixos nao serem sempre os campeoes
+    ordem_produtos = list(range(1, m_produtos + 1))
+    rnd.shuffle(ordem_produtos)
+    ids_clientes = range(1, n_clientes + 1)
+    lote = 10000
+    for base in range(1, k + 1, lote):
+        tamanho = min(lote, k - base + 1)
+        produtos = rnd.choices(ordem_produtos, cum_weights=pesos_produtos, k=tamanho)
+        clientes = rnd.choices(ids_clientes, cum_weights=pesos_clientes, k=tamanho)
+        for i in range(tamanho):
+            yield (
+                base + i,
+                produtos[i],
+                inicio + timedelta(days=rnd.randrange(dias)),
+                clientes[i],
+            )
+
+
+def gerar_interesses(n: int, semente: int = SEMENTE_PADRAO) -> Iterator[dict]:
+    """Gera os documentos de interesses (colecao do MongoDB) dos clientes 1..n.
+
+    O nome vem de gerar_clientes com a mesma semente, entao bate com o PostgreSQL.
+    """
+    rnd = _rng(semente, "interesses")
+    pesos = _pesos_zipf(len(INTERESSES), 0.8)
+    for cid, _, nome, *_ in gerar_clientes(n, semente):
+        quantidade = rnd.randint(1, 6)
+        interesses = list(dict.fromkeys(rnd.choices(INTERESSES, cum_weights=pesos, k=quantidade)))
+        yield {
+            "id_cliente": cid,
+            "nome": nome,
+            "interesses": interesses,
+            "resumo": f"{rnd.choice(RESUMOS)} interessado em {interesses[0]}",
+        }
+
+
+def gerar_amizades(n: int, grau_medio: float = 10.0, semente: int = SEMENTE_PADRAO) -> Iterator[Tuple[int, int]]:
+    """Gera arestas (id_pessoa, id_amigo) de um grafo social entre os clientes 1..n.
+
+    Cada pessoa tem em media grau_medio amigos. Parte das arestas fica no mesmo
+    "bairro" de ids (comunidades) e parte vai para pessoas populares (Zipf), o que
+    da a cauda longa tipica de redes sociais. Nao gera lacos nem arestas repetidas.
+    """
+    rnd = _rng(semente, "amizades")
+    pesos_populares = _pesos_zipf(n, 0.9)
+    ordem_popular = list(range(1, n + 1))
+    rnd.shuffle(ordem_popular)
+    raio = max(10, int(grau_medio * 5))
+    for pessoa in range(1, n + 1):
+        grau = min(n - 1, int(rnd.expovariate(1.0 / grau_medio) + 0.5))
+        amigos = set()
+        tentativas = 0
+        while len(amigos) < grau and tentativas < grau * 4:
+            tentativas += 1
+            if rnd.random() < 0.7:
+                amigo = pessoa + rnd.randint(-raio, raio)
+                if amigo < 1 or amigo > n:
+                    continue
+            else:
+                amigo = rnd.choices(ordem_popular, cum_weights=pesos_populares)[0]
+            if amigo != pessoa:
+                amigos.add(amigo)
+        for amigo in sorted(amigos):
+            yield (pessoa, amigo)
@@ -0,0 +1,108 @@
+"""
+Grafo de amizades em formato CSR (compressed sparse row) com arrays NumPy.
+Montado uma vez por integracao a partir das arestas do Neo4j; cada aresta ocupa
+4 bytes em indices, em vez de um int Python dentro de uma lista por cliente.
+Os payloads consolidados recebem os amigos de amigos_compactos(), um array('q')
+com 8 bytes por amigo, e nao uma lista de ints.
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class GrafoAmizades:
+    """Adjacencia CSR: os amigos do no i sao ids[indices[indptr[i]:indptr[i + 1]]].
+
+    ids eh o vetor ordenado de ids de clientes; a posicao de um id eh achada por
+    busca binaria. Expoe get(cid, padrao) para poder ser usado no lugar do antigo
+    Dict[int, List[int]] devolvido por buscar_neo4j.
+    """
+
+    def __init__(self, ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def de_arestas(cls, origens: Iterable[int], destinos: Iterable[int]) -> "GrafoAmizades":
+        """Monta o grafo a partir de arestas dirigidas, mantendo a ordem dos amigos."""
+        origens = np.asarray(origens, dtype=np.int64)
+        destinos = np.asarray(destinos, dtype=np.int64)
+        ids = np.unique(np.concatenate([origens, destinos]))
+        src = np.searchsorted(ids, origens)
+        dst = np.searchsorted(ids, destinos)
+        ordem = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        return cls(ids, indptr, dst[ordem].astype(np.int32))
+
+    @classmethod
+    def de_dict(cls, amigos: Dict[int, List[int]]) -> "GrafoAmizades":
+        origens = array("q")
+        destinos = array("q")
+        for cid, lista in amigos.items():
+            origens.extend([cid] * len(lista))
+            destinos.extend(lista)
+        return cls.de_arestas(origens, destinos)
+
+    @classmethod
+    def vazio(cls) -> "GrafoAmizades":
+        return cls.de_arestas(array("q"), array("q"))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def total_arestas(self) -> int:
+        return len(self.indices)
+
+    @property
+    def bytes(self) -> int:
+        return self.ids.nbytes + self.indptr.nbytes + self.indices.nbytes
+
+    def _posicao(self, cid: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.ids, cid))
+        if pos < len(self.ids) and self.ids[pos] == cid:
+            return pos
+        return None
+
+    def _vizinhos_pos(self, pos: int) -> np.ndarray:
+        return self.indices[self.indptr[pos]:self.indptr[pos + 1]]
+
+    def vizinhos(self, cid: int) -> np.ndarray:
+        """Ids dos amigos diretos (vetor vazio se o cliente nao esta no grafo)."""
+        pos = self._posicao(cid)
+        if pos is None:
+            return self.ids[:0]
+        return self.ids[self._vizinhos_pos(pos)]
+
+    def get(self, cid: int, padrao=None) -> Optional[List[int]]:
+        pos = self._posicao(cid)
+        if pos is None or self.indptr[pos] == self.indptr[pos + 1]:
+            return padrao
+        return self.ids[self._vizinhos_pos(pos)].tolist()
+
+    def amigos_compactos(self, cid: int) -> array:
+        """Amigos em array('q'): itera como uma lista de ints sem um objeto int por amigo."""
+        pos = self._posicao(cid)
+        if pos is None:
+            return array("q")
+        return array("q", self.ids[self._vizinhos_pos(pos)].tobytes())
+
+    def amigos_de_amigos(self, cid: int) -> np.ndarray:
+        """Ids a exatamente dois saltos (sem o proprio cliente e sem amigos diretos)."""
+        pos = self._posicao(cid)
+        if pos is None:
+            return self.ids[:0]
+        diretos = self._vizinhos_pos(pos)
+        if len(diretos) == 0:
+            return self.ids[:0]
+        segundo = np.concatenate([self._vizinhos_pos(p) for p in diretos])
+        segundo = np.setdiff1d(segundo, np.append(diretos, pos))
+        return self.ids[segundo]
+
+    def arestas(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Devolve (origens, destinos) em ids, na ordem do CSR."""
+        origens = np.repeat(self.ids, np.diff(self.indptr))
+        return origens, self.ids[self.indices]
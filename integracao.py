@@ -2,101 +2,258 @@
 Integracao de quatro bases (PostgreSQL, MongoDB, Neo4j e Redis).
 Fluxo: ler dados das fontes, consolidar em memoria e gravar no Redis para consulta.
 A API pode chamar a funcao main() ou reaproveitar as funcoes abaixo.
+
+Com --workers/--shards a carga completa eh dividida em particoes de clientes
+(por hash ou faixa de ids), extraidas, consolidadas e gravadas no Redis em
+processos separados; o processo principal junta o snapshot, calcula as
+recomendacoes (que cruzam particoes) e publica a geracao.
 """
+import argparse
 import json
 import os
-from typing import Dict, List, Any
+import sys
+import threading
+import time
+import uuid
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
-import psycopg2
-from neo4j import GraphDatabase
-from pymongo import MongoClient
+from bson import ObjectId
 import redis
 
+from chaves_redis import (
+    CANAL_SNAPSHOT,
+    CHAVE_GERACAO_ATUAL,
+    CHAVE_GERACAO_SEQ,
+    CHAVE_VERSAO,
+    chave_cliente,
+    chave_indice_clientes,
+    geracao_da_chave,
+    nova_versao,
+    prefixo,
+    resolver_geracao,
+)
+from fornecimento_xml import ARQUIVO_FORNECIMENTO, integrar_fornecimento
+from grafo import GrafoAmizades
+from metricas import RelatorioExecucao
+from recomendacao import calcular_recomendacoes, clientes_dependentes
+import conexoes
+import snapshot
+
 # Configuracoes via variaveis de ambiente (ajuste conforme seu ambiente)
-PG_DSN = os.getenv("PG_DSN", "dbname=postgres user=postgres password=postgres host=localhost port=5432")
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "bd2")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "interesses")
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j12345")
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+PG_ITERSIZE = int(os.getenv("PG_ITERSIZE", "2000"))
+RECS_SALTOS = int(os.getenv("RECS_SALTOS", "1"))
+RECS_DECAIMENTO = float(os.getenv("RECS_DECAIMENTO", "0.5"))
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "1000"))
+PROJECAO_MONGO = {"_id": 0, "id_cliente": 1, "nome": 1, "interesses": 1, "resumo": 1}
+REDIS_BATCH_SIZE = int(os.getenv("REDIS_BATCH_SIZE", "500"))
+ARQUIVO_JSON = os.getenv("ARQUIVO_DADOS", "dados_consolidados.json")
+WATERMARK_ARQUIVO = os.getenv("WATERMARK_ARQUIVO", "watermarks.json")
+# Geracoes mantidas no Redis (a atual + anteriores ainda lidas por requisicoes em andamento)
+REDIS_GERACOES_MANTIDAS = int(os.getenv("REDIS_GERACOES_MANTIDAS", "2"))
+# Relatorio de metricas da execucao (.prom = texto do Prometheus, outro = JSON)
+METRICAS_ARQUIVO = os.getenv("METRICAS_ARQUIVO")
+# Modo particionado: processos em paralelo e como os clientes sao divididos
+INTEGRACAO_WORKERS = int(os.getenv("INTEGRACAO_WORKERS", "1"))
+PARTICIONAMENTOS = ("hash", "faixa")
+
+# Tempo, linhas, bytes e erros por etapa da execucao atual
+relatorio = RelatorioExecucao("integracao")
 
 
+# Enderecos e credenciais ficam em conexoes.py; os clientes abaixo sao compartilhados
+# pelo processo inteiro e fechados no encerramento, entao nao devem ser fechados aqui.
 def obter_conexao_postgres():
-    try:
-        return psycopg2.connect(PG_DSN)
-    except Exception as exc:
-        raise RuntimeError(f"Falha ao conectar ao PostgreSQL: {exc}") from exc
+    """Conexao do pool para usar em `with`: commit no fim do bloco e devolucao ao pool."""
+    return conexoes.conexao_postgres()
 
 
 def obter_cliente_mongo():
     try:
-        return MongoClient(MONGO_URI)
+        return conexoes.cliente_mongo()
     except Exception as exc:
         raise RuntimeError(f"Falha ao conectar ao MongoDB: {exc}") from exc
 
 
 def obter_driver_neo4j():
     try:
-        return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        return conexoes.driver_neo4j()
     except Exception as exc:
         raise RuntimeError(f"Falha ao conectar ao Neo4j: {exc}") from exc
 
 
 def obter_cliente_redis():
     try:
-        return redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        return conexoes.cliente_redis()
     except Exception as exc:
         raise RuntimeError(f"Falha ao conectar ao Redis: {exc}") from exc
 
 
-def buscar_postgres() -> Dict[str, Any]:
-    """Coleta clientes, compras e produtos no relacional."""
+SQL_CLIENTES = "SELECT id, cpf, nome, endereco, cidade, uf, email FROM clientes"
+SQL_COMPRAS = "SELECT id, id_produto, data, id_cliente FROM compras"
+SQL_PRODUTOS = "SELECT id, produto, valor, quantidade, tipo FROM produtos"
+SQL_FAIXA_CLIENTES = "SELECT MIN(id), MAX(id) FROM clientes"
+
+
+class Particao(NamedTuple):
+    """Fatia dos clientes integrada por um processo do modo particionado.
+
+    Por hash (id % total == indice) as fatias ficam equilibradas mesmo com
+    buracos nos ids; por faixa (inicio <= id <= fim) cada consulta usa o
+    indice da chave primaria como intervalo. Compras, interesses e amizades
+    sao filtrados pelo id do cliente dono, entao nenhum cliente aparece em
+    duas particoes.
+    """
+    indice: int
+    total: int
+    inicio: Optional[int] = None
+    fim: Optional[int] = None
+
+    def filtro_sql(self, coluna: str) -> Tuple[str, Tuple[int, int]]:
+        if self.inicio is None:
+            return f"{coluna} %% %s = %s", (self.total, self.indice)
+        return f"{coluna} BETWEEN %s AND %s", (self.inicio, self.fim)
+
+    def filtro_mongo(self) -> Dict[str, Any]:
+        if self.inicio is None:
+            return {"id_cliente": {"$mod": [self.total, self.indice]}}
+        return {"id_cliente": {"$gte": self.inicio, "$lte": self.fim}}
+
+    def filtro_cypher(self, variavel: str) -> Tuple[str, Dict[str, int]]:
+        if self.inicio is None:
+            return f"{variavel}.id % $total = $indice", {"total": self.total, "indice": self.indice}
+        return f"{variavel}.id >= $inicio AND {variavel}.id <= $fim", {"inicio": self.inicio, "fim": self.fim}
+
+
+def particionar(total: int, modo: str = "hash") -> List[Particao]:
+    """Divide os clientes em total particoes; por faixa consulta o menor e o maior id."""
+    if modo not in PARTICIONAMENTOS:
+        raise ValueError(f"Particionamento desconhecido: '{modo}' (use {' ou '.join(PARTICIONAMENTOS)})")
+    if modo == "hash":
+        return [Particao(i, total) for i in range(total)]
+    with obter_conexao_postgres() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SQL_FAIXA_CLIENTES)
+            menor, maior = cur.fetchone()
+    if menor is None:
+        return [Particao(0, 1, 0, -1)]
+    tamanho = -(-(maior - menor + 1) // total)
+    return [
+        Particao(i, total, menor + i * tamanho, min(maior, menor + (i + 1) * tamanho - 1))
+        for i in range(total)
+        if menor + i * tamanho <= maior
+    ]
+
+
+def _consultas_postgres(particao: Optional[Particao] = None):
+    """(sql, parametros) de clientes, compras e produtos; produtos nunca sao particionados."""
+    if particao is None:
+        return (SQL_CLIENTES, None), (SQL_COMPRAS, None), (SQL_PRODUTOS, None)
+    filtro_clientes, parametros = particao.filtro_sql("id")
+    filtro_compras, _ = particao.filtro_sql("id_cliente")
+    return (
+        (f"{SQL_CLIENTES} WHERE {filtro_clientes}", parametros),
+        (f"{SQL_COMPRAS} WHERE {filtro_compras}", parametros),
+        (SQL_PRODUTOS, None),
+    )
+
+
+def _linha_cliente(row) -> Dict[str, Any]:
+    return {
+        "id": row[0],
+        "cpf": row[1],
+        "nome": row[2],
+        "endereco": row[3],
+        "cidade": row[4],
+        "uf": row[5],
+        "email": row[6],
+    }
+
+
+def _linha_compra(row) -> Dict[str, Any]:
+    return {
+        "id": row[0],
+        "id_produto": row[1],
+        "data": row[2].isoformat() if row[2] else None,
+        "id_cliente": row[3],
+    }
+
+
+def _linha_produto(row) -> Dict[str, Any]:
+    return {
+        "id": row[0],
+        "produto": row[1],
+        "valor": float(row[2]),
+        "quantidade": row[3],
+        "tipo": row[4],
+    }
+
+
+def _stream_postgres(sql: str, conversor, itersize: int, parametros=None) -> Iterator[Dict[str, Any]]:
+    """Executa a consulta em um cursor nomeado (server-side) e gera as linhas convertidas.
+
+    A conexao e o DECLARE sao feitos aqui, antes do primeiro next(), para que erros de
+    conexao aparecam em buscar_postgres e nao no meio da consolidacao. O servidor envia
+    itersize linhas por vez; a conexao volta ao pool quando o gerador termina.
+    """
+    conn = conexoes.emprestar_postgres()
+    try:
+        cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cur.itersize = itersize
+        cur.execute(sql, parametros)
+    except Exception:
+        conexoes.devolver_postgres(conn)
+        raise
+
+    def linhas():
+        # Em streaming as linhas so sao lidas durante consolidar(); a contagem entra no fim
+        total = 0
+        try:
+            for row in cur:
+                total += 1
+                yield conversor(row)
+        finally:
+            relatorio.anotar("buscar_postgres", linhas_saida=total)
+            cur.close()
+            conexoes.devolver_postgres(conn)
+
+    return linhas()
+
+
+def buscar_postgres(streaming: bool = False, itersize: int = PG_ITERSIZE,
+                    particao: Optional[Particao] = None) -> Dict[str, Any]:
+    """Coleta clientes, compras e produtos no relacional (so os clientes da particao, se houver).
+
+    Com streaming=True cada tabela vira um gerador lido por cursor server-side, e a
+    memoria fica limitada a itersize linhas por tabela em vez da tabela inteira.
+    """
+    (sql_clientes, p_clientes), (sql_compras, p_compras), (sql_produtos, p_produtos) = _consultas_postgres(particao)
     try:
+        if streaming:
+            return {
+                "clientes": _stream_postgres(sql_clientes, _linha_cliente, itersize, p_clientes),
+                "compras": _stream_postgres(sql_compras, _linha_compra, itersize, p_compras),
+                "produtos": _stream_postgres(sql_produtos, _linha_produto, itersize, p_produtos),
+            }
+
         with obter_conexao_postgres() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, cpf, nome, endereco, cidade, uf, email FROM clientes;")
+                cur.execute(sql_clientes, p_clientes)
                 clientes = cur.fetchall()
-                cur.execute("SELECT id, id_produto, data, id_cliente FROM compras;")
+                cur.execute(sql_compras, p_compras)
                 compras = cur.fetchall()
-                cur.execute("SELECT id, produto, valor, quantidade, tipo FROM produtos;")
+                cur.execute(sql_produtos, p_produtos)
                 produtos = cur.fetchall()
 
         dados = {
-            "clientes": [
-                {
-                    "id": row[0],
-                    "cpf": row[1],
-                    "nome": row[2],
-                    "endereco": row[3],
-                    "cidade": row[4],
-                    "uf": row[5],
-                    "email": row[6],
-                }
-                for row in clientes
-            ],
-            "compras": [
-                {
-                    "id": row[0],
-                    "id_produto": row[1],
-                    "data": row[2].isoformat() if row[2] else None,
-                    "id_cliente": row[3],
-                }
-                for row in compras
-            ],
-            "produtos": [
-                {
-                    "id": row[0],
-                    "produto": row[1],
-                    "valor": float(row[2]),
-                    "quantidade": row[3],
-                    "tipo": row[4],
-                }
-                for row in produtos
-            ],
+            "clientes": [_linha_cliente(row) for row in clientes],
+            "compras": [_linha_compra(row) for row in compras],
+            "produtos": [_linha_produto(row) for row in produtos],
         }
         return dados
     except Exception as exc:
@@ -104,12 +261,26 @@ def buscar_postgres() -> Dict[str, Any]:
         raise RuntimeError("PostgreSQL eh obrigatorio. Nao foi possivel continuar.") from exc
 
 
-def buscar_mongo() -> Dict[int, Dict[str, Any]]:
-    """Retorna interesses por id_cliente."""
+def buscar_mongo(ids: Optional[Iterable[int]] = None, batch_size: int = MONGO_BATCH_SIZE,
+                 particao: Optional[Particao] = None,
+                 vazio_se_falhar: bool = True) -> Optional[Dict[int, Dict[str, Any]]]:
+    """Retorna interesses por id_cliente (todos, os ids informados ou os da particao).
+
+    Traz so os campos usados, sem _id, em lotes de batch_size documentos. O filtro
+    por ids usa $in sobre id_cliente, indexado por seed_mongo.py. Se o MongoDB
+    falhar retorna {} (ou None com vazio_se_falhar=False, para o chamador
+    distinguir "sem interesses" de "nao foi possivel ler").
+    """
     try:
         cliente = obter_cliente_mongo()
         colecao = cliente[MONGO_DB][MONGO_COLLECTION]
-        docs = colecao.find({})
+        filtros = []
+        if ids is not None:
+            filtros.append({"id_cliente": {"$in": list(ids)}})
+        if particao is not None:
+            filtros.append(particao.filtro_mongo())
+        filtro = filtros[0] if len(filtros) == 1 else ({"$and": filtros} if filtros else {})
+        docs = colecao.find(filtro, PROJECAO_MONGO, batch_size=batch_size)
         interesses = {}
         for doc in docs:
             cid = int(doc.get("id_cliente")) if doc.get("id_cliente") is not None else None
@@ -120,46 +291,127 @@ def buscar_mongo() -> Dict[int, Dict[str, Any]]:
                 "interesses": doc.get("interesses", []),
                 "resumo": doc.get("resumo"),
             }
-        cliente.close()
         return interesses
     except Exception as exc:
+        relatorio.anotar("buscar_mongo", erros=1)
         print(f"[AVISO] MongoDB indisponivel: {exc}")
         print("[AVISO] Continuando sem dados de interesses...")
-        return {}
+        return {} if vazio_se_falhar else None
 
 
-def buscar_neo4j() -> Dict[int, List[int]]:
-    """Retorna amigos por cliente (id -> lista de ids de amigos)."""
+def buscar_neo4j(ids: Optional[Iterable[int]] = None, particao: Optional[Particao] = None,
+                 vazio_se_falhar: bool = True) -> Optional[GrafoAmizades]:
+    """Retorna o grafo de amigos (CSR); grafo.get(id, []) da a lista de amigos do cliente.
+
+    Se o Neo4j falhar retorna um grafo vazio (ou None com vazio_se_falhar=False).
+    """
     try:
         driver = obter_driver_neo4j()
-        amigos: Dict[int, List[int]] = {}
+        origens = array("q")
+        destinos = array("q")
+        condicoes = []
+        parametros: Dict[str, Any] = {}
+        if ids is not None:
+            condicoes.append("c.id IN $ids")
+            parametros["ids"] = list(ids)
+        if particao is not None:
+            condicao, valores = particao.filtro_cypher("c")
+            condicoes.append(condicao)
+            parametros.update(valores)
         consulta = (
             "MATCH (c:Pessoa)-[:AMIGO_DE]->(a:Pessoa) "
-            "RETURN c.id AS id_cliente, a.id AS id_amigo"
+            + (f"WHERE {' AND '.join(condicoes)} " if condicoes else "")
+            + "RETURN c.id AS id_cliente, a.id AS id_amigo"
         )
         with driver.session() as session:
-            for record in session.run(consulta):
-                cid = int(record["id_cliente"])
-                aid = int(record["id_amigo"])
-                amigos.setdefault(cid, []).append(aid)
-        driver.close()
-        return amigos
+            for record in session.run(consulta, parametros):
+                origens.append(int(record["id_cliente"]))
+                destinos.append(int(record["id_amigo"]))
+        grafo = GrafoAmizades.de_arestas(origens, destinos)
+        print(f"[Neo4j] {grafo.total_arestas} amizades, {len(grafo)} pessoas ({grafo.bytes / 1024:.0f} KiB em CSR)")
+        return grafo
     except Exception as exc:
+        relatorio.anotar("buscar_neo4j", erros=1)
         print(f"[AVISO] Neo4j indisponivel: {exc}")
         print("[AVISO] Continuando sem dados de amigos...")
-        return {}
+        return GrafoAmizades.vazio() if vazio_se_falhar else None
+
+
+def _rotulo(particao: Optional[Particao]) -> str:
+    return "" if particao is None else f"[{particao.indice + 1}/{particao.total}]"
+
 
+def _linhas_postgres(dpg: Dict[str, Any]) -> int:
+    # Geradores (modo streaming) sao contados por _stream_postgres conforme sao lidos
+    return sum(len(tabela) for tabela in dpg.values() if isinstance(tabela, list))
 
-def consolidar(dpg: Dict[str, Any], interesses: Dict[int, Dict[str, Any]], amigos: Dict[int, List[int]]):
-    """Une dados das 3 fontes em um dicionario por cliente."""
+
+def _medir_fonte(etapa: str, funcao, contar):
+    """Roda uma leitura registrando tempo, linhas lidas e erros no relatorio."""
+    inicio = time.perf_counter()
+    with relatorio.etapa(etapa):
+        resultado = funcao()
+    relatorio.anotar(etapa, linhas_saida=contar(resultado))
+    return resultado, time.perf_counter() - inicio
+
+
+def extrair_fontes(streaming: bool = False, itersize: int = PG_ITERSIZE, particao: Optional[Particao] = None):
+    """Le PostgreSQL, MongoDB e Neo4j ao mesmo tempo em um pool de threads.
+
+    As tres leituras sao independentes ate consolidar(), entao o tempo total passa
+    a ser o da fonte mais lenta. PostgreSQL continua obrigatorio (o erro eh
+    propagado); MongoDB e Neo4j ja retornam vazio quando indisponiveis. Em modo
+    streaming o tempo do PostgreSQL cobre so a abertura dos cursores; as linhas
+    sao lidas durante consolidar().
+    """
+    fontes = (
+        ("PostgreSQL", "buscar_postgres",
+         partial(buscar_postgres, streaming=streaming, itersize=itersize, particao=particao), _linhas_postgres),
+        ("MongoDB", "buscar_mongo", partial(buscar_mongo, particao=particao), len),
+        ("Neo4j", "buscar_neo4j", partial(buscar_neo4j, particao=particao), lambda grafo: grafo.total_arestas),
+    )
+    inicio = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=len(fontes), thread_name_prefix="extracao")
+    try:
+        futuros = {
+            nome: pool.submit(_medir_fonte, etapa, funcao, contar)
+            for nome, etapa, funcao, contar in fontes
+        }
+        resultados = {}
+        tempos = {}
+        for nome, futuro in futuros.items():
+            resultados[nome], tempos[nome] = futuro.result()
+    finally:
+        # Se o PostgreSQL falhar nao espera as outras fontes terminarem
+        pool.shutdown(wait=False, cancel_futures=True)
+    total = time.perf_counter() - inicio
+
+    for nome, duracao in tempos.items():
+        print(f"[Extracao]{_rotulo(particao)} {nome}: {duracao:.2f}s")
+    mais_lenta = max(tempos, key=tempos.get)
+    print(
+        f"[Extracao]{_rotulo(particao)} Caminho critico: {mais_lenta} ({tempos[mais_lenta]:.2f}s); "
+        f"total {total:.2f}s contra {sum(tempos.values()):.2f}s em sequencia"
+    )
+    return resultados["PostgreSQL"], resultados["MongoDB"], resultados["Neo4j"]
+
+
+def consolidar(dpg: Dict[str, Any], interesses: Dict[int, Dict[str, Any]], amigos: GrafoAmizades):
+    """Une dados das 3 fontes em um dicionario por cliente.
+
+    dpg pode trazer listas ou geradores (buscar_postgres(streaming=True)); cada
+    tabela eh percorrida uma unica vez, produtos primeiro, e as compras sao
+    agrupadas por cliente conforme chegam. Os amigos de cada cliente ficam em um
+    array('q') tirado do grafo CSR (8 bytes por amigo em vez de um int Python);
+    o snapshot os converte em lista so na serializacao.
+    """
     produtos_idx = {p["id"]: p for p in dpg["produtos"]}
     compras_por_cliente: Dict[int, List[Dict[str, Any]]] = {}
     for compra in dpg["compras"]:
-        item = compra.copy()
         prod = produtos_idx.get(compra["id_produto"])
         if prod:
-            item["produto"] = prod
-        compras_por_cliente.setdefault(compra["id_cliente"], []).append(item)
+            compra = {**compra, "produto": prod}
+        compras_por_cliente.setdefault(compra["id_cliente"], []).append(compra)
 
     consolidados = {}
     for cli in dpg["clientes"]:
@@ -167,65 +419,191 @@ def consolidar(dpg: Dict[str, Any], interesses: Dict[int, Dict[str, Any]], amigo
         consolidados[cid] = {
             "cliente": cli,
             "interesses": interesses.get(cid, {}),
-            "amigos": amigos.get(cid, []),
+            "amigos": amigos.amigos_compactos(cid),
             "compras": compras_por_cliente.get(cid, []),
         }
     return consolidados
 
 
-def gravar_redis(cache: redis.Redis, consolidados: Dict[int, Dict[str, Any]]):
-    """Grava no Redis usando hashes e listas; limpa chaves do namespace cliente:* antes."""
+CAMPOS_HASH_CLIENTE = ("id", "cpf", "nome", "endereco", "cidade", "uf", "email")
+
+
+def _enfileirar_cliente_redis(pipe, geracao: int, cid: int, payload: Dict[str, Any],
+                              com_recs: bool = True) -> Tuple[int, int]:
+    """Enfileira todas as chaves de um cliente no pipeline; retorna (chaves gravadas, bytes dos valores)."""
+    base_key = chave_cliente(geracao, cid)
+    cli = payload["cliente"]
+
+    # Hash do cliente em um unico HSET com mapping
+    campos = {campo: str(cli.get(campo, "")) for campo in CAMPOS_HASH_CLIENTE}
+    pipe.hset(base_key, mapping=campos)
+    tamanho = sum(len(v) for v in campos.values())
+
+    # Listas gravadas com um unico RPUSH variadico
+    pipe.delete(f"{base_key}:amigos", f"{base_key}:compras")
+    amigos = [str(a) for a in payload.get("amigos", [])]
+    if amigos:
+        pipe.rpush(f"{base_key}:amigos", *amigos)
+    compras = [json.dumps(c, default=str) for c in payload.get("compras", [])]
+    if compras:
+        pipe.rpush(f"{base_key}:compras", *compras)
+    tamanho += sum(map(len, amigos)) + sum(map(len, compras))
+
+    interesses = json.dumps(payload.get("interesses", {}))
+    pipe.set(f"{base_key}:interesses", interesses)
+    pipe.zadd(chave_indice_clientes(geracao), {str(cid): cid})
+    chaves = 2 + bool(amigos) + bool(compras)
+    tamanho += len(interesses)
+    if com_recs:
+        recs = json.dumps(payload.get("recs", []))
+        pipe.set(f"{base_key}:recs", recs)
+        chaves += 1
+        tamanho += len(recs)
+    return chaves, tamanho
+
+
+def _gravar_clientes_redis(cache: redis.Redis, geracao: int, consolidados: Dict[int, Dict[str, Any]],
+                           tamanho_lote: int = REDIS_BATCH_SIZE, com_recs: bool = True) -> Tuple[int, int]:
+    """Grava os clientes na geracao em pipelines de tamanho_lote; retorna (chaves, bytes)."""
+    pipe = cache.pipeline(transaction=False)
+    total_chaves = 0
+    total_bytes = 0
+    pendentes = 0
+    for cid, payload in consolidados.items():
+        chaves, tamanho = _enfileirar_cliente_redis(pipe, geracao, cid, payload, com_recs)
+        total_chaves += chaves
+        total_bytes += tamanho
+        pendentes += 1
+        if pendentes >= tamanho_lote:
+            pipe.execute()
+            pendentes = 0
+    pipe.execute()
+    return total_chaves, total_bytes
+
+
+def _gravar_recs_redis(cache: redis.Redis, geracao: int, consolidados: Dict[int, Dict[str, Any]],
+                       tamanho_lote: int = REDIS_BATCH_SIZE) -> Tuple[int, int]:
+    """Grava so v{n}:cliente:{id}:recs (o resto ja foi gravado pelas particoes)."""
+    pipe = cache.pipeline(transaction=False)
+    total_bytes = 0
+    for i, (cid, payload) in enumerate(consolidados.items(), 1):
+        recs = json.dumps(payload.get("recs", []))
+        pipe.set(f"{chave_cliente(geracao, cid)}:recs", recs)
+        total_bytes += len(recs)
+        if i % tamanho_lote == 0:
+            pipe.execute()
+    pipe.execute()
+    return len(consolidados), total_bytes
+
+
+def _publicar_geracao(cache: redis.Redis, geracao: int, total_clientes: int):
+    """Grava o meta da geracao e troca o ponteiro: a partir daqui os leitores a enxergam inteira."""
+    versao = nova_versao(geracao)
+    cache.hset(f"{prefixo(geracao)}meta", mapping={
+        "gerado_em": datetime.now().isoformat(),
+        "total_clientes": total_clientes,
+        "versao": versao,
+    })
+    _publicar_versao(cache, versao, geracao)
+
+
+# Limpezas de geracoes antigas em andamento (veja aguardar_expiracoes)
+_expiracoes: List[threading.Thread] = []
+
+
+def _agendar_expiracao(cache: redis.Redis, geracao: int, tamanho_lote: int = REDIS_BATCH_SIZE):
+    thread = threading.Thread(
+        target=_expirar_geracoes_antigas,
+        args=(cache, geracao, tamanho_lote),
+        name="expirar-geracoes",
+    )
+    thread.start()
+    _expiracoes.append(thread)
+
+
+def aguardar_expiracoes():
+    """Espera as limpezas agendadas por gravar_redis terminarem."""
+    while _expiracoes:
+        _expiracoes.pop().join()
+
+
+def _expirar_geracoes_antigas(cache: redis.Redis, geracao: int, tamanho_lote: int = REDIS_BATCH_SIZE):
+    """Remove com UNLINK as geracoes antigas e as chaves cliente:* sem versao."""
+    limite = geracao - REDIS_GERACOES_MANTIDAS + 1
+    removidas = 0
+    try:
+        pipe = cache.pipeline(transaction=False)
+        pendentes = 0
+        for padrao in ("v*:*", "cliente:*", "integracao:*"):
+            for key in cache.scan_iter(match=padrao, count=1000):
+                ger = geracao_da_chave(key)
+                if padrao == "v*:*" and (ger is None or ger >= limite):
+                    continue
+                pipe.unlink(key)
+                pendentes += 1
+                if pendentes >= tamanho_lote:
+                    pipe.execute()
+                    removidas += pendentes
+                    pendentes = 0
+        pipe.execute()
+        removidas += pendentes
+        print(f"[Redis] {removidas} chaves de geracoes antigas removidas")
+    except Exception as exc:
+        print(f"[AVISO] Falha ao remover geracoes antigas do Redis: {exc}")
+
+
+def _publicar_versao(cache: redis.Redis, versao: str, geracao: Optional[int] = None):
+    """Troca a versao (e o ponteiro da geracao, se informada) e anuncia no canal, em um MULTI."""
+    pipe = cache.pipeline(transaction=True)
+    if geracao is not None:
+        pipe.mset({CHAVE_GERACAO_ATUAL: geracao, CHAVE_VERSAO: versao})
+    else:
+        pipe.set(CHAVE_VERSAO, versao)
+    # Cada worker da API assina o canal e descarta seus caches de respostas
+    pipe.publish(CANAL_SNAPSHOT, versao)
+    pipe.execute()
+
+
+def gravar_redis(cache: redis.Redis, consolidados: Dict[int, Dict[str, Any]], tamanho_lote: int = REDIS_BATCH_SIZE):
+    """Grava no Redis usando hashes e listas em uma geracao nova (v{n}:cliente:*).
+
+    Os comandos sao enviados em pipelines nao transacionais de tamanho_lote clientes,
+    entao o custo de rede fica em uma ida e volta por lote e nao por campo. Leitores
+    so passam a ver a geracao nova quando o ponteiro geracao:atual eh trocado; as
+    geracoes antigas sao removidas depois, em segundo plano.
+    """
     try:
         # Teste de conectividade
         cache.ping()
-        
-        for key in cache.scan_iter(match="cliente:*"):
-            cache.delete(key)
+        inicio = time.perf_counter()
+        geracao = cache.incr(CHAVE_GERACAO_SEQ)
 
-        for cid, payload in consolidados.items():
-            base_key = f"cliente:{cid}"
-            cli = payload["cliente"]
-            
-            # Grava dados do cliente como hash (formato chave-valor individual)
-            cache.hset(base_key, "id", str(cli.get("id", "")))
-            cache.hset(base_key, "cpf", str(cli.get("cpf", "")))
-            cache.hset(base_key, "nome", str(cli.get("nome", "")))
-            cache.hset(base_key, "cidade", str(cli.get("cidade", "")))
-            cache.hset(base_key, "uf", str(cli.get("uf", "")))
-            cache.hset(base_key, "email", str(cli.get("email", "")))
-
-            # Grava amigos como lista
-            cache.delete(f"{base_key}:amigos")
-            amigos = payload.get("amigos", [])
-            if amigos:
-                for a in amigos:
-                    cache.rpush(f"{base_key}:amigos", str(a))
-
-            # Grava compras como lista JSON
-            cache.delete(f"{base_key}:compras")
-            compras = payload.get("compras", [])
-            if compras:
-                for c in compras:
-                    cache.rpush(f"{base_key}:compras", json.dumps(c, default=str))
-
-            # Grava interesses como string JSON
-            cache.set(f"{base_key}:interesses", json.dumps(payload.get("interesses", {})))
-            
-            # Grava recomendações como string JSON
-            cache.set(f"{base_key}:recs", json.dumps(payload.get("recs", [])))
-        
-        print(f"[Redis] {len(consolidados)} clientes gravados com sucesso!")
+        total_chaves, total_bytes = _gravar_clientes_redis(cache, geracao, consolidados, tamanho_lote)
+        total_chaves += 2  # meta e indice ordenado de ids
+
+        # Troca atomica: a partir daqui os leitores enxergam a geracao nova inteira
+        _publicar_geracao(cache, geracao, len(consolidados))
+
+        duracao = time.perf_counter() - inicio
+        taxa = total_chaves / duracao if duracao > 0 else float("inf")
+        print(f"[Redis] {len(consolidados)} clientes gravados com sucesso na geracao v{geracao}!")
+        print(f"[Redis] {total_chaves} chaves em {duracao:.2f}s ({taxa:,.0f} chaves/s, lote={tamanho_lote})")
+        relatorio.anotar("gravar_redis", linhas_entrada=len(consolidados), linhas_saida=total_chaves,
+                         bytes=total_bytes)
+
+        _agendar_expiracao(cache, geracao, tamanho_lote)
         return True
     except Exception as exc:
+        relatorio.anotar("gravar_redis", erros=1)
         print(f"[AVISO] Redis indisponivel: {exc}")
         print("[AVISO] Salvando dados em arquivo JSON em vez de Redis...")
         return False
 
 
-def salvar_json(consolidados: Dict[int, Dict[str, Any]]):
-    """Salva os dados consolidados em um arquivo JSON para consulta."""
+def salvar_json(consolidados: Dict[int, Dict[str, Any]], formato: str = snapshot.SNAPSHOT_FORMATO):
+    """Salva os dados consolidados no snapshot para consulta (JSON ou formato binario)."""
     try:
-        arquivo = "dados_consolidados.json"
+        arquivo = snapshot.caminho(ARQUIVO_JSON, formato)
         
         # Converte para formato serializavel
         dados_json = {}
@@ -235,58 +613,470 @@ def salvar_json(consolidados: Dict[int, Dict[str, Any]]):
                 "interesses": payload["interesses"],
                 "amigos": payload["amigos"],
                 "compras": payload["compras"],
+                "recs": payload.get("recs", []),
             }
         
-        with open(arquivo, "w", encoding="utf-8") as f:
-            json.dump(dados_json, f, ensure_ascii=False, indent=2)
+        # Escreve em arquivo temporario e troca de uma vez para a API nunca ler pela metade
+        inicio = time.perf_counter()
+        tamanho = snapshot.salvar(arquivo, dados_json, formato)
         
-        print(f"[JSON] Dados consolidados salvos em '{arquivo}'")
+        print(f"[JSON] Dados consolidados salvos em '{arquivo}' ({formato}, {tamanho:,} bytes em {time.perf_counter() - inicio:.2f}s)")
+        relatorio.anotar("salvar_json", linhas_entrada=len(consolidados), bytes=tamanho)
         print(f"[JSON] {len(consolidados)} clientes salvos")
         return True
     except Exception as exc:
+        relatorio.anotar("salvar_json", erros=1)
         print(f"[ERRO] Falha ao salvar JSON: {exc}")
         return False
 
 
-def main():
-    print("[1/5] Lendo PostgreSQL...")
-    dpg = buscar_postgres()
+def carregar_json(formato: str = snapshot.SNAPSHOT_FORMATO) -> Dict[int, Dict[str, Any]]:
+    """Le o snapshot salvo por salvar_json de volta para o formato de consolidar()."""
+    dados = snapshot.carregar(snapshot.caminho(ARQUIVO_JSON, formato))
+    return {int(cid): payload for cid, payload in dados.items()}
 
-    print("[2/5] Lendo MongoDB...")
-    interesses = buscar_mongo()
 
-    print("[3/5] Lendo Neo4j...")
-    amigos = buscar_neo4j()
+def carregar_watermarks() -> Optional[Dict[str, Any]]:
+    """Retorna as marcas da ultima integracao ou None se nunca foram gravadas."""
+    try:
+        with open(WATERMARK_ARQUIVO, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    print("[4/5] Consolidando dados...")
-    consolidados = consolidar(dpg, interesses, amigos)
 
-    print("[5/5] Gravando dados...")
-    cache = obter_cliente_redis()
-    redis_ok = gravar_redis(cache, consolidados)
-    
-    # Sempre salva em JSON como backup
-    salvar_json(consolidados)
+def salvar_watermarks(marcas: Dict[str, Any]):
+    temporario = f"{WATERMARK_ARQUIVO}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({**marcas, "atualizado_em": datetime.now().isoformat()}, f, indent=2)
+    os.replace(temporario, WATERMARK_ARQUIVO)
+
+
+def _marca_postgres(consolidados: Dict[int, Dict[str, Any]], anterior: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Maior compras.id ja integrado e maior id de cliente conhecido."""
+    marca = {
+        "compras_id": (anterior or {}).get("compras_id", 0),
+        "clientes_id": max(consolidados, default=0),
+    }
+    for payload in consolidados.values():
+        for compra in payload["compras"]:
+            marca["compras_id"] = max(marca["compras_id"], compra["id"])
+    return marca
+
+
+def _marca_mongo() -> Dict[str, Any]:
+    """Maior _id da colecao e, se houver replica set, um resume token de change stream.
+
+    Deve ser chamada antes da leitura: o que mudar durante a extracao aparece de novo
+    na proxima execucao incremental, o que eh inofensivo.
+    """
+    marca: Dict[str, Any] = {"mongo_id": None, "mongo_resume_token": None}
+    try:
+        cliente = obter_cliente_mongo()
+        colecao = cliente[MONGO_DB][MONGO_COLLECTION]
+        ultimo = colecao.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        if ultimo:
+            marca["mongo_id"] = str(ultimo["_id"])
+        try:
+            with colecao.watch() as stream:
+                stream.try_next()
+                marca["mongo_resume_token"] = stream.resume_token
+        except Exception:
+            # Change streams exigem replica set; sem ele usa apenas o _id
+            pass
+    except Exception as exc:
+        print(f"[AVISO] Nao foi possivel registrar marca do MongoDB: {exc}")
+    return marca
+
+
+def _delta_postgres(marcas: Dict[str, Any]):
+    """Compras com id acima da marca, clientes novos e os produtos dessas compras."""
+    with obter_conexao_postgres() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"{SQL_COMPRAS} WHERE id > %s ORDER BY id", (marcas.get("compras_id", 0),))
+            compras = [_linha_compra(row) for row in cur.fetchall()]
+
+            ids_clientes = {c["id_cliente"] for c in compras}
+            cur.execute(f"{SQL_CLIENTES} WHERE id > %s OR id = ANY(%s)",
+                        (marcas.get("clientes_id", 0), list(ids_clientes)))
+            clientes = [_linha_cliente(row) for row in cur.fetchall()]
+
+            ids_produtos = list({c["id_produto"] for c in compras})
+            cur.execute(f"{SQL_PRODUTOS} WHERE id = ANY(%s)", (ids_produtos,))
+            produtos = [_linha_produto(row) for row in cur.fetchall()]
+    return {"clientes": clientes, "compras": compras, "produtos": produtos}
+
+
+def _delta_mongo(marcas: Dict[str, Any]) -> Set[int]:
+    """Ids de clientes cujos interesses mudaram desde a ultima marca."""
+    alterados: Set[int] = set()
+    try:
+        cliente = obter_cliente_mongo()
+        colecao = cliente[MONGO_DB][MONGO_COLLECTION]
+        token = marcas.get("mongo_resume_token")
+        lido_por_stream = False
+        if token:
+            try:
+                with colecao.watch(resume_after=token, full_document="updateLookup") as stream:
+                    while True:
+                        mudanca = stream.try_next()
+                        if mudanca is None:
+                            break
+                        doc = mudanca.get("fullDocument") or {}
+                        if doc.get("id_cliente") is not None:
+                            alterados.add(int(doc["id_cliente"]))
+                lido_por_stream = True
+            except Exception as exc:
+                print(f"[AVISO] Change stream indisponivel, usando _id: {exc}")
+        if not lido_por_stream and marcas.get("mongo_id"):
+            filtro = {"_id": {"$gt": ObjectId(marcas["mongo_id"])}}
+            for doc in colecao.find(filtro, {"id_cliente": 1}):
+                if doc.get("id_cliente") is not None:
+                    alterados.add(int(doc["id_cliente"]))
+    except Exception as exc:
+        print(f"[AVISO] MongoDB indisponivel: {exc}")
+    return alterados
+
+
+def integrar_incremental(consolidados: Dict[int, Dict[str, Any]], marcas: Dict[str, Any]) -> Set[int]:
+    """Aplica sobre consolidados apenas o que mudou desde as marcas; retorna os ids afetados.
+
+    Compras novas sao detectadas por compras.id, clientes novos por clientes.id e
+    interesses por change stream (ou _id) do MongoDB. Para os clientes afetados os
+    interesses e amigos sao relidos por completo. Mudancas apenas no grafo do Neo4j
+    ou em linhas antigas do PostgreSQL so aparecem na proxima carga completa.
+    """
+    dpg = _delta_postgres(marcas)
+    afetados = {c["id"] for c in dpg["clientes"]} | {c["id_cliente"] for c in dpg["compras"]}
+    afetados |= {cid for cid in _delta_mongo(marcas) if cid in consolidados}
+    if not afetados:
+        return afetados
+
+    ids = sorted(afetados)
+    # Fonte opcional fora do ar: os clientes ja consolidados mantem interesses e
+    # amigos da ultima leitura em vez de ficarem vazios
+    interesses = buscar_mongo(ids, vazio_se_falhar=False)
+    amigos = buscar_neo4j(ids, vazio_se_falhar=False)
+    novos = consolidar(dpg, interesses or {}, amigos or GrafoAmizades.vazio())
+    for cid in ids:
+        payload = consolidados.get(cid) or novos.get(cid)
+        if payload is None:
+            # Compra de cliente que nao esta no snapshot nem veio na consulta
+            afetados.discard(cid)
+            continue
+        if cid in novos and payload is not novos[cid]:
+            # novos[cid] traz o cadastro atual e apenas as compras acima da marca
+            payload["cliente"] = novos[cid]["cliente"]
+            ja_gravadas = {c["id"] for c in payload["compras"]}
+            payload["compras"] = payload["compras"] + [
+                c for c in novos[cid]["compras"] if c["id"] not in ja_gravadas
+            ]
+        if interesses is not None:
+            payload["interesses"] = interesses.get(cid, {})
+        if amigos is not None:
+            payload["amigos"] = amigos.amigos_compactos(cid)
+        consolidados[cid] = payload
+    return afetados
+
+
+def _integrar_particao(particao: Particao, geracao: Optional[int], streaming: bool = False,
+                       itersize: int = PG_ITERSIZE) -> Dict[str, Any]:
+    """Roda em um processo do pool: extrai, consolida e grava no Redis uma particao.
+
+    As recomendacoes ficam para o processo principal, porque dependem das compras
+    de amigos que podem estar em outras particoes.
+    """
+    relatorio.reiniciar()
+    inicio = time.perf_counter()
+    dpg, interesses, amigos = extrair_fontes(streaming=streaming, itersize=itersize, particao=particao)
+    with relatorio.etapa("consolidar"):
+        consolidados = consolidar(dpg, interesses, amigos)
+    relatorio.anotar("consolidar", linhas_saida=len(consolidados))
+
+    redis_ok = False
+    if geracao is not None:
+        with relatorio.etapa("gravar_redis"):
+            try:
+                chaves, tamanho = _gravar_clientes_redis(obter_cliente_redis(), geracao, consolidados, com_recs=False)
+                relatorio.anotar("gravar_redis", linhas_entrada=len(consolidados), linhas_saida=chaves, bytes=tamanho)
+                redis_ok = True
+            except Exception as exc:
+                relatorio.anotar("gravar_redis", erros=1)
+                print(f"[AVISO]{_rotulo(particao)} Redis indisponivel: {exc}")
+    return {
+        "particao": particao,
+        "consolidados": consolidados,
+        "redis_ok": redis_ok,
+        "segundos": time.perf_counter() - inicio,
+        "etapas": relatorio.para_dict()["etapas"],
+    }
+
+
+def integrar_particionado(particoes: List[Particao], workers: int, geracao: Optional[int],
+                          streaming: bool = False, itersize: int = PG_ITERSIZE) -> Tuple[Dict[int, Dict[str, Any]], bool]:
+    """Integra as particoes em um pool de processos e junta os resultados.
+
+    Retorna (consolidados de todas as particoes, se todas gravaram no Redis). As
+    etapas das particoes sao somadas no relatorio (tempo de CPU, nao de relogio);
+    o tempo de cada particao fica na etapa particao_{indice}.
+    """
+    consolidados: Dict[int, Dict[str, Any]] = {}
+    redis_ok = geracao is not None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futuros = [pool.submit(_integrar_particao, p, geracao, streaming, itersize) for p in particoes]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            particao = resultado["particao"]
+            consolidados.update(resultado["consolidados"])
+            redis_ok = redis_ok and resultado["redis_ok"]
+            for etapa, valores in resultado["etapas"].items():
+                relatorio.anotar(etapa, **valores)
+            relatorio.anotar(f"particao_{particao.indice}", segundos=resultado["segundos"],
+                             linhas_saida=len(resultado["consolidados"]))
+            detalhes = ", ".join(f"{etapa} {v['segundos']:.2f}s" for etapa, v in resultado["etapas"].items())
+            print(f"[Particao {particao.indice + 1}/{particao.total}] {len(resultado['consolidados'])} clientes "
+                  f"em {resultado['segundos']:.2f}s ({detalhes})")
+    finally:
+        # Se uma particao falhar (PostgreSQL eh obrigatorio) nao espera as outras
+        pool.shutdown(wait=False, cancel_futures=True)
+    return consolidados, redis_ok
+
+
+def _reservar_geracao(cache: redis.Redis) -> Optional[int]:
+    """Cria o numero da geracao que as particoes vao preencher; None se o Redis nao responder."""
+    try:
+        cache.ping()
+        return cache.incr(CHAVE_GERACAO_SEQ)
+    except Exception as exc:
+        print(f"[AVISO] Redis indisponivel: {exc}")
+        print("[AVISO] Salvando dados em arquivo JSON em vez de Redis...")
+        return None
+
+
+def publicar_particionado(cache: redis.Redis, geracao: int, consolidados: Dict[int, Dict[str, Any]],
+                          tamanho_lote: int = REDIS_BATCH_SIZE):
+    """Grava as recomendacoes na geracao ja preenchida pelas particoes e a publica."""
+    try:
+        inicio = time.perf_counter()
+        chaves, tamanho = _gravar_recs_redis(cache, geracao, consolidados, tamanho_lote)
+        _publicar_geracao(cache, geracao, len(consolidados))
+        print(f"[Redis] {len(consolidados)} clientes publicados na geracao v{geracao} "
+              f"({chaves} recomendacoes gravadas em {time.perf_counter() - inicio:.2f}s)")
+        relatorio.anotar("gravar_redis", linhas_saida=chaves + 1, bytes=tamanho)
+        _agendar_expiracao(cache, geracao, tamanho_lote)
+        return True
+    except Exception as exc:
+        relatorio.anotar("gravar_redis", erros=1)
+        print(f"[AVISO] Redis indisponivel: {exc}")
+        return False
+
+
+def atualizar_redis(cache: redis.Redis, consolidados: Dict[int, Dict[str, Any]], ids: Iterable[int],
+                    tamanho_lote: int = REDIS_BATCH_SIZE):
+    """Regrava apenas os clientes informados na geracao ja publicada.
+
+    Cada lote vai em um pipeline transacional (MULTI/EXEC), entao um leitor nunca
+    ve um cliente com a lista apagada e ainda nao regravada. Sem geracao publicada,
+    faz a carga completa com gravar_redis().
+    """
+    try:
+        geracao = resolver_geracao(cache)
+        if geracao is None:
+            return gravar_redis(cache, consolidados, tamanho_lote)
+
+        ids = list(ids)
+        if not ids:
+            # Nada mudou: manter a versao preserva os ETags e caches da API
+            print(f"[Redis] Nenhum cliente alterado; geracao v{geracao} mantida")
+            return True
+        total_chaves = 0
+        total_bytes = 0
+        pipe = cache.pipeline(transaction=True)
+        for inicio in range(0, len(ids), tamanho_lote):
+            for cid in ids[inicio:inicio + tamanho_lote]:
+                chaves, tamanho = _enfileirar_cliente_redis(pipe, geracao, cid, consolidados[cid])
+                total_chaves += chaves
+                total_bytes += tamanho
+            pipe.execute()
+        versao = nova_versao(geracao)
+        cache.hset(f"{prefixo(geracao)}meta", mapping={
+            "gerado_em": datetime.now().isoformat(),
+            "total_clientes": len(consolidados),
+            "versao": versao,
+        })
+        # Mesma geracao, conteudo novo: a versao muda para invalidar os ETags e caches da API
+        _publicar_versao(cache, versao)
+        print(f"[Redis] {len(ids)} clientes atualizados na geracao v{geracao}")
+        relatorio.anotar("atualizar_redis", linhas_entrada=len(ids), linhas_saida=total_chaves,
+                         bytes=total_bytes)
+        return True
+    except Exception as exc:
+        relatorio.anotar("atualizar_redis", erros=1)
+        print(f"[AVISO] Redis indisponivel: {exc}")
+        return False
+
+
+def main(streaming: bool = False, itersize: int = PG_ITERSIZE, incremental: bool = False,
+         saltos: int = RECS_SALTOS, decaimento: float = RECS_DECAIMENTO,
+         formato: str = snapshot.SNAPSHOT_FORMATO, arquivo_metricas: Optional[str] = METRICAS_ARQUIVO,
+         workers: int = INTEGRACAO_WORKERS, particoes: Optional[int] = None, particionamento: str = "hash"):
+    relatorio.reiniciar()
+    total_particoes = particoes or workers
+    if incremental and total_particoes > 1:
+        print("[AVISO] O modo incremental ja le so as alteracoes; ignorando --workers/--shards")
+        total_particoes = 1
+    arquivo_snapshot = snapshot.caminho(ARQUIVO_JSON, formato)
+    marcas = carregar_watermarks() if incremental else None
+    if incremental and (marcas is None or not os.path.exists(arquivo_snapshot)):
+        print("[AVISO] Sem marcas ou snapshot anteriores; executando carga completa")
+        incremental = False
+
+    if incremental:
+        print("[1-4/5] Lendo apenas alteracoes desde a ultima integracao...")
+        marca_mongo = _marca_mongo()
+        with relatorio.etapa("carregar_snapshot"):
+            consolidados = carregar_json(formato)
+        relatorio.anotar("carregar_snapshot", linhas_saida=len(consolidados))
+        with relatorio.etapa("integrar_incremental"):
+            afetados = integrar_incremental(consolidados, marcas)
+            # Quem tem um cliente afetado como amigo tambem precisa de recomendacoes novas
+            afetados = clientes_dependentes(consolidados, afetados, saltos) if afetados else afetados
+        relatorio.anotar("integrar_incremental", linhas_saida=len(afetados))
+        grafo = None
+        if saltos >= 2 and afetados:
+            grafo = GrafoAmizades.de_dict({cid: p["amigos"] for cid, p in consolidados.items()})
+        with relatorio.etapa("recomendacoes"):
+            total_recs = calcular_recomendacoes(consolidados, afetados, grafo, saltos, decaimento)
+        relatorio.anotar("recomendacoes", linhas_entrada=len(afetados), linhas_saida=total_recs)
+        print(f"[Incremental] {len(afetados)} clientes afetados")
+
+        print("[5/5] Gravando dados...")
+        cache = obter_cliente_redis()
+        with relatorio.etapa("atualizar_redis"):
+            redis_ok = atualizar_redis(cache, consolidados, afetados)
+        arquivo_ok = True
+        if afetados:
+            with relatorio.etapa("salvar_json"):
+                arquivo_ok = salvar_json(consolidados, formato)
+    else:
+        marca_mongo = _marca_mongo()
+        cache = obter_cliente_redis()
+        if total_particoes > 1:
+            geracao = _reservar_geracao(cache)
+            lista = particionar(total_particoes, particionamento)
+            print(f"[1-4/5] Lendo e consolidando {len(lista)} particoes ({particionamento}) "
+                  f"em {min(workers, len(lista))} processo(s)...")
+            with relatorio.etapa("particoes"):
+                consolidados, redis_ok = integrar_particionado(lista, workers, geracao, streaming, itersize)
+            relatorio.anotar("particoes", linhas_saida=len(consolidados))
+            # O grafo global so eh necessario para amigos de amigos
+            amigos = None
+            if saltos >= 2:
+                amigos = GrafoAmizades.de_dict({cid: p["amigos"] for cid, p in consolidados.items()})
+        else:
+            print("[1-3/5] Lendo PostgreSQL, MongoDB e Neo4j em paralelo...")
+            dpg, interesses, amigos = extrair_fontes(streaming=streaming, itersize=itersize)
+
+            print("[4/5] Consolidando dados...")
+            with relatorio.etapa("consolidar"):
+                consolidados = consolidar(dpg, interesses, amigos)
+            # Em streaming as linhas do PostgreSQL so terminam de ser contadas aqui
+            lidas = relatorio.etapas.get("buscar_postgres", {}).get("linhas_saida", 0)
+            relatorio.anotar("consolidar", linhas_entrada=lidas + len(interesses) + amigos.total_arestas,
+                             linhas_saida=len(consolidados))
+        inicio = time.perf_counter()
+        with relatorio.etapa("recomendacoes"):
+            total_recs = calcular_recomendacoes(consolidados, grafo=amigos, saltos=saltos, decaimento=decaimento)
+        relatorio.anotar("recomendacoes", linhas_entrada=len(consolidados), linhas_saida=total_recs)
+        print(f"[Recomendacoes] {total_recs} clientes em {time.perf_counter() - inicio:.2f}s ({saltos} salto(s))")
+
+        print("[5/5] Gravando dados...")
+        with relatorio.etapa("gravar_redis"):
+            if total_particoes > 1:
+                # As particoes ja gravaram o resto; falta recs e a troca do ponteiro
+                redis_ok = redis_ok and publicar_particionado(cache, geracao, consolidados)
+            else:
+                redis_ok = gravar_redis(cache, consolidados)
+
+        # Sempre salva o snapshot em arquivo como backup
+        with relatorio.etapa("salvar_json"):
+            arquivo_ok = salvar_json(consolidados, formato)
+
+    # As marcas so avancam quando Redis e snapshot receberam tudo; senao a proxima
+    # execucao incremental pularia as alteracoes desta, que nunca seriam gravadas
+    sucesso = redis_ok and arquivo_ok
+    if sucesso:
+        # Se o MongoDB nao respondeu mantem as marcas antigas dele
+        if marca_mongo["mongo_id"] is None and marcas:
+            marca_mongo = {k: marcas.get(k) for k in ("mongo_id", "mongo_resume_token")}
+        salvar_watermarks({**_marca_postgres(consolidados, marcas), **marca_mongo})
     
     print("\n" + "="*60)
-    print("INTEGRACAO CONCLUIDA COM SUCESSO!")
+    print("INTEGRACAO CONCLUIDA COM SUCESSO!" if sucesso else "INTEGRACAO CONCLUIDA COM FALHAS!")
     print("="*60)
     
     if redis_ok:
         print("✓ Dados gravados no Redis")
         print("\nConsulte com:")
         print("  redis-cli")
-        print("  KEYS cliente:*")
-        print("  HGETALL cliente:1")
+        print("  GET geracao:atual")
+        print("  HGETALL v<geracao>:cliente:1")
     else:
-        print("✓ Dados salvos em JSON: dados_consolidados.json")
-        print("  (Redis nao esta disponivel)")
+        print("✗ Redis nao esta disponivel ou a gravacao falhou")
+    if arquivo_ok:
+        print(f"✓ Dados salvos em arquivo: {arquivo_snapshot}")
+    else:
+        print(f"✗ Falha ao salvar o snapshot em arquivo: {arquivo_snapshot}")
+    if not sucesso:
+        print(f"[ERRO] Marcas em {WATERMARK_ARQUIVO} mantidas; rode de novo depois de corrigir a falha")
     
+    print("\nMetricas por etapa:")
+    for linha in relatorio.resumo():
+        print(f"  {linha}")
+    if arquivo_metricas:
+        relatorio.salvar(arquivo_metricas)
+        print(f"  (relatorio gravado em {arquivo_metricas})")
+
     print("\nProximas etapas:")
     print("  1. Visualizar dados: python visualizar_dados.py")
     print("  2. Iniciar API:      python api.py")
     print("  3. Consultar em:     http://localhost:8000")
+    return sucesso
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Integra PostgreSQL, MongoDB e Neo4j no Redis")
+    parser.add_argument("--streaming", action="store_true",
+                        help="le o PostgreSQL com cursores server-side em vez de fetchall()")
+    parser.add_argument("--itersize", type=int, default=PG_ITERSIZE,
+                        help=f"linhas por ida ao servidor no modo streaming (padrao {PG_ITERSIZE})")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"aplica apenas o que mudou desde as marcas em {WATERMARK_ARQUIVO}")
+    parser.add_argument("--saltos", type=int, choices=(1, 2), default=RECS_SALTOS,
+                        help="1 = compras de amigos; 2 = tambem amigos de amigos, com peso decaido")
+    parser.add_argument("--decaimento", type=float, default=RECS_DECAIMENTO,
+                        help=f"peso de uma compra de amigo de amigo (padrao {RECS_DECAIMENTO})")
+    parser.add_argument("--formato", choices=snapshot.FORMATOS, default=snapshot.SNAPSHOT_FORMATO,
+                        help=f"formato do snapshot em arquivo (padrao {snapshot.SNAPSHOT_FORMATO})")
+    parser.add_argument("--fornecimento", nargs="?", const=ARQUIVO_FORNECIMENTO, metavar="XML",
+                        help=f"antes, integra o XML de fornecimentos com Peca/Fornecedor/Projeto (padrao {ARQUIVO_FORNECIMENTO})")
+    parser.add_argument("--metricas", default=METRICAS_ARQUIVO, metavar="ARQUIVO",
+                        help="grava as metricas por etapa (.prom = formato texto do Prometheus, senao JSON)")
+    parser.add_argument("--workers", type=int, nargs="?", const=os.cpu_count(), default=INTEGRACAO_WORKERS,
+                        help="processos da carga completa particionada (sem numero: um por nucleo)")
+    parser.add_argument("--shards", type=int, help="quantidade de particoes (padrao: uma por worker)")
+    parser.add_argument("--particionamento", choices=PARTICIONAMENTOS, default="hash",
+                        help="hash = id %% particoes; faixa = intervalos contiguos de ids")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error(f"--workers deve ser pelo menos 1 (recebido {args.workers})")
+    if args.shards is not None and args.shards < 1:
+        parser.error(f"--shards deve ser pelo menos 1 (recebido {args.shards})")
+    if args.fornecimento:
+        integrar_fornecimento(args.fornecimento)
+    ok = main(streaming=args.streaming, itersize=args.itersize, incremental=args.incremental,
+              saltos=args.saltos, decaimento=args.decaimento, formato=args.formato,
+              arquivo_metricas=args.metricas, workers=args.workers, particoes=args.shards,
+              particionamento=args.particionamento)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,254 @@
+"""
+Metricas da integracao e da API, exportaveis no formato texto do Prometheus ou
+em JSON. Implementacao minima e sem dependencias: contadores, medidas e
+histogramas com rotulos, mais o relatorio por etapa de uma execucao da
+integracao (tempo, linhas de entrada/saida, bytes e erros).
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Limites (em segundos) dos baldes de latencia das requisicoes da API
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MIDIA_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _chave(rotulos: Dict[str, Any]) -> Rotulos:
+    return tuple(sorted((nome, str(valor)) for nome, valor in rotulos.items()))
+
+
+def _formatar_rotulos(rotulos: Rotulos, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(rotulos) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    escapar = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{nome}="{escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._lock = threading.Lock()
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Valor que so cresce (ex.: total de erros)."""
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str):
+        super().__init__(nome, ajuda)
+        self._valores: Dict[Rotulos, float] = {}
+
+    def incrementar(self, valor: float = 1, **rotulos):
+        chave = _chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def prometheus(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return self._cabecalho() + [f"{self.nome}{_formatar_rotulos(r)} {_numero(v)}" for r, v in itens]
+
+    def para_dict(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"rotulos": dict(r), "valor": v} for r, v in sorted(self._valores.items())]
+
+
+class Medida(Contador):
+    """Valor instantaneo que pode subir ou descer (gauge)."""
+    tipo = "gauge"
+
+    def definir(self, valor: float, **rotulos):
+        with self._lock:
+            self._valores[_chave(rotulos)] = valor
+
+
+class Histograma(_Metrica):
+    """Distribuicao em baldes acumulados, com soma e contagem por serie."""
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, limites: Sequence[float] = LIMITES_LATENCIA):
+        super().__init__(nome, ajuda)
+        self.limites = tuple(sorted(limites))
+        # rotulos -> [contagem por balde (nao acumulada), soma, total]
+        self._series: Dict[Rotulos, list] = {}
+
+    def observar(self, valor: float, **rotulos):
+        chave = _chave(rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.limites), 0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def _acumulados(self, baldes: List[int]) -> Iterator[Tuple[float, int]]:
+        acumulado = 0
+        for limite, quantidade in zip(self.limites, baldes):
+            acumulado += quantidade
+            yield limite, acumulado
+
+    def prometheus(self) -> List[str]:
+        with self._lock:
+            series = sorted((r, (list(s[0]), s[1], s[2])) for r, s in self._series.items())
+        linhas = self._cabecalho()
+        for rotulos, (baldes, soma, total) in series:
+            for limite, acumulado in self._acumulados(baldes):
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, ('le', _numero(limite)))} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, ('le', '+Inf'))} {total}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(rotulos)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(rotulos)} {total}")
+        return linhas
+
+    def para_dict(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            series = sorted((r, (list(s[0]), s[1], s[2])) for r, s in self._series.items())
+        return [
+            {
+                "rotulos": dict(rotulos),
+                "baldes": {_numero(limite): acumulado for limite, acumulado in self._acumulados(baldes)},
+                "soma": soma,
+                "total": total,
+            }
+            for rotulos, (baldes, soma, total) in series
+        ]
+
+
+class Registro:
+    """Conjunto de metricas exportadas juntas (ex.: o /metrics da API)."""
+
+    def __init__(self):
+        self._metricas: List[_Metrica] = []
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome: str, ajuda: str) -> Contador:
+        return self._registrar(Contador(nome, ajuda))
+
+    def medida(self, nome: str, ajuda: str) -> Medida:
+        return self._registrar(Medida(nome, ajuda))
+
+    def histograma(self, nome: str, ajuda: str, limites: Sequence[float] = LIMITES_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, limites))
+
+    def prometheus(self) -> str:
+        return "\n".join(linha for m in self._metricas for linha in m.prometheus()) + "\n"
+
+    def para_dict(self) -> Dict[str, Any]:
+        return {m.nome: {"tipo": m.tipo, "ajuda": m.ajuda, "series": m.para_dict()} for m in self._metricas}
+
+
+CAMPOS_ETAPA = ("segundos", "linhas_entrada", "linhas_saida", "bytes", "erros")
+
+
+class RelatorioExecucao:
+    """Metricas por etapa de uma execucao (tempo, linhas, bytes e erros).
+
+    Seguro para uso em threads: as etapas de extracao rodam em paralelo.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.etapas: Dict[str, Dict[str, float]] = {}
+            self.iniciado_em = datetime.now()
+            self._inicio = time.perf_counter()
+
+    def anotar(self, etapa: str, **valores: float):
+        """Soma valores (segundos, linhas_entrada, linhas_saida, bytes, erros) na etapa."""
+        with self._lock:
+            atual = self.etapas.setdefault(etapa, dict.fromkeys(CAMPOS_ETAPA, 0))
+            for campo, valor in valores.items():
+                atual[campo] += valor
+
+    @contextmanager
+    def etapa(self, nome: str):
+        """Cronometra um bloco; um erro que escapa do bloco eh contado e repassado."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.anotar(nome, erros=1)
+            raise
+        finally:
+            self.anotar(nome, segundos=time.perf_counter() - inicio)
+
+    def para_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            etapas = {nome: dict(valores) for nome, valores in self.etapas.items()}
+        return {
+            "execucao": self.nome,
+            "iniciado_em": self.iniciado_em.isoformat(),
+            "duracao_segundos": time.perf_counter() - self._inicio,
+            "etapas": etapas,
+        }
+
+    def para_prometheus(self) -> str:
+        dados = self.para_dict()
+        registro = Registro()
+        medidas = {campo: registro.medida(f"{self.nome}_etapa_{campo}", f"{campo} por etapa da ultima execucao")
+                   for campo in CAMPOS_ETAPA}
+        for etapa, valores in dados["etapas"].items():
+            for campo, valor in valores.items():
+                medidas[campo].definir(valor, etapa=etapa)
+        registro.medida(f"{self.nome}_duracao_segundos", "Duracao total da ultima execucao").definir(
+            dados["duracao_segundos"])
+        registro.medida(f"{self.nome}_ultima_execucao_timestamp", "Inicio da ultima execucao (epoch)").definir(
+            self.iniciado_em.timestamp())
+        return registro.prometheus()
+
+    def salvar(self, arquivo: str):
+        """Grava o relatorio: texto do Prometheus se o arquivo terminar em .prom, senao JSON."""
+        if arquivo.endswith(".prom"):
+            conteudo = self.para_prometheus()
+        else:
+            conteudo = json.dumps(self.para_dict(), indent=2)
+        # Troca atomica: o node_exporter (textfile collector) nunca le o arquivo pela metade
+        temporario = f"{arquivo}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+        os.replace(temporario, arquivo)
+
+    def resumo(self) -> List[str]:
+        """Linhas legiveis para o log do final da execucao."""
+        linhas = []
+        for etapa, v in self.para_dict()["etapas"].items():
+            linha = f"{etapa:<18} {v['segundos']:8.2f}s"
+            if v["linhas_entrada"]:
+                linha += f"  entrada {v['linhas_entrada']:,.0f}"
+            if v["linhas_saida"]:
+                linha += f"  saida {v['linhas_saida']:,.0f}"
+            if v["bytes"]:
+                linha += f"  {v['bytes'] / 2**20:,.1f} MiB"
+            if v["erros"]:
+                linha += f"  erros {v['erros']:.0f}"
+            linhas.append(linha)
+        return linhas
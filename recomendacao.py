@@ -0,0 +1,170 @@
+"""
+Recomendacoes de produtos a partir das compras dos amigos e dos interesses do cliente.
+A integracao calcula tudo em lote e grava em payload["recs"]; a API so recalcula
+na hora para clientes que ainda nao tem recomendacoes gravadas.
+"""
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set
+
+_PALAVRA = re.compile(r"\w+")
+
+# Peso de uma compra feita por amigo de amigo (a de um amigo direto vale 1)
+DECAIMENTO_PADRAO = 0.5
+
+
+def normalizar(termo: Optional[str]) -> str:
+    return (termo or "").strip().lower()
+
+
+class IndiceInteresses:
+    """Indice invertido de termo de interesse -> ids de produto.
+
+    Um termo casa com um produto se for igual ao tipo ou estiver contido no nome
+    (a mesma regra do filtro original). Termos so com letras/digitos nunca cruzam
+    um separador, entao basta procurar nos tokens do nome; o resultado de cada
+    termo eh calculado uma vez e reaproveitado por todos os clientes.
+    """
+
+    def __init__(self, produtos: Iterable[Dict[str, Any]] = ()):
+        self.por_tipo: Dict[str, Set[Any]] = {}
+        self.por_token: Dict[str, Set[Any]] = {}
+        self._nomes: Dict[str, Set[Any]] = {}
+        self._por_termo: Dict[str, FrozenSet[Any]] = {}
+        for prod in produtos:
+            self.adicionar(prod)
+
+    def adicionar(self, prod: Dict[str, Any]):
+        prod_id = prod.get("id")
+        nome = normalizar(prod.get("produto"))
+        self.por_tipo.setdefault(normalizar(prod.get("tipo")), set()).add(prod_id)
+        self._nomes.setdefault(nome, set()).add(prod_id)
+        for token in _PALAVRA.findall(nome):
+            self.por_token.setdefault(token, set()).add(prod_id)
+        self._por_termo.clear()
+
+    def produtos_do_termo(self, termo: str) -> FrozenSet[Any]:
+        termo = normalizar(termo)
+        ids = self._por_termo.get(termo)
+        if ids is None:
+            encontrados = set(self.por_tipo.get(termo, ()))
+            if _PALAVRA.fullmatch(termo):
+                vocabulario = (t for t in self.por_token if termo in t)
+                for token in vocabulario:
+                    encontrados |= self.por_token[token]
+            else:
+                for nome, nome_ids in self._nomes.items():
+                    if termo in nome:
+                        encontrados |= nome_ids
+            ids = self._por_termo[termo] = frozenset(encontrados)
+        return ids
+
+    def filtrar(self, candidatos: Iterable[Any], interesses: Iterable[str]) -> Set[Any]:
+        """Ids dentre candidatos que casam com algum dos interesses."""
+        candidatos = set(candidatos)
+        aceitos: Set[Any] = set()
+        for termo in interesses:
+            aceitos |= candidatos & self.produtos_do_termo(termo)
+        return aceitos
+
+
+def gerar_recomendacoes(interesses_cli: List[str], compras_amigos: Iterable[List[Dict[str, Any]]],
+                        indice: Optional[IndiceInteresses] = None,
+                        compras_amigos_de_amigos: Optional[Iterable[List[Dict[str, Any]]]] = None,
+                        decaimento: float = DECAIMENTO_PADRAO) -> List[Dict[str, Any]]:
+    """Produtos comprados pelos amigos que batem com os interesses, mais comprados primeiro.
+
+    Sem indice, monta um apenas com os produtos dos amigos. Se compras de amigos
+    de amigos forem informadas (modo de dois saltos), cada uma vale decaimento (e a de um amigo direto vale 1); os
+    itens ganham "pontuacao" e "comprado_por_amigos_de_amigos" e sao ordenados pela
+    pontuacao.
+    """
+    dois_saltos = compras_amigos_de_amigos is not None
+    produtos_amigos = {}
+    for salto, grupos in ((0, compras_amigos), (1, compras_amigos_de_amigos or ())):
+        for compras in grupos:
+            for compra in compras:
+                prod = compra.get("produto", {})
+                prod_id = prod.get("id")
+                if prod_id not in produtos_amigos:
+                    produtos_amigos[prod_id] = {
+                        "produto": prod.get("produto"),
+                        "tipo": prod.get("tipo"),
+                        "valor": prod.get("valor"),
+                        "contagens": [0, 0],
+                        "_prod": prod,
+                    }
+                produtos_amigos[prod_id]["contagens"][salto] += 1
+
+    if indice is None:
+        indice = IndiceInteresses(info["_prod"] for info in produtos_amigos.values())
+    aceitos = indice.filtrar(produtos_amigos, interesses_cli)
+
+    # Filtra recomendacoes por tipo/interesse
+    recomendacoes = []
+    for prod_id, info in produtos_amigos.items():
+        if prod_id not in aceitos:
+            continue
+        diretos, distantes = info["contagens"]
+        quem = "Amigos seus" if diretos else "Amigos de amigos seus"
+        item = {
+            "produto": info["produto"],
+            "tipo": info["tipo"],
+            "valor": info["valor"],
+            "motivo": f"{quem} compraram. Voce tem interesse em {info['tipo']}",
+            "comprado_por": diretos
+        }
+        if dois_saltos:
+            item["comprado_por_amigos_de_amigos"] = distantes
+            item["pontuacao"] = round(diretos + decaimento * distantes, 4)
+        recomendacoes.append(item)
+    chave = "pontuacao" if dois_saltos else "comprado_por"
+    return sorted(recomendacoes, key=lambda x: x[chave], reverse=True)
+
+
+def clientes_dependentes(consolidados: Dict[int, Dict[str, Any]], ids: Iterable[int], saltos: int = 1) -> Set[int]:
+    """Os ids informados mais todo cliente que alcanca algum deles em ate saltos amizades."""
+    resultado = set(ids)
+    fronteira = set(resultado)
+    for _ in range(saltos):
+        fronteira = {
+            cid for cid, payload in consolidados.items()
+            if cid not in resultado and not fronteira.isdisjoint(payload.get("amigos", []))
+        }
+        if not fronteira:
+            break
+        resultado |= fronteira
+    return resultado
+
+
+def calcular_recomendacoes(consolidados: Dict[int, Dict[str, Any]], ids: Optional[Iterable[int]] = None,
+                           grafo=None, saltos: int = 1, decaimento: float = DECAIMENTO_PADRAO) -> int:
+    """Preenche payload["recs"] dos clientes (todos ou apenas ids); retorna quantos calculou.
+
+    Com saltos=2 tambem considera as compras de amigos de amigos, buscados no grafo
+    CSR (grafo.GrafoAmizades) sem nenhuma consulta extra ao Neo4j.
+    """
+    catalogo = {
+        compra["produto"].get("id"): compra["produto"]
+        for payload in consolidados.values()
+        for compra in payload.get("compras", [])
+        if compra.get("produto")
+    }
+    indice = IndiceInteresses(catalogo.values())
+    usar_dois_saltos = saltos >= 2 and grafo is not None
+    total = 0
+    for cid in (consolidados if ids is None else ids):
+        payload = consolidados.get(cid)
+        if payload is None:
+            continue
+        interesses_cli = payload.get("interesses", {}).get("interesses", [])
+        distantes = grafo.amigos_de_amigos(cid).tolist() if usar_dois_saltos else None
+        payload["recs"] = gerar_recomendacoes(
+            interesses_cli,
+            (consolidados[aid]["compras"] for aid in payload.get("amigos", []) if aid in consolidados),
+            indice,
+            None if distantes is None else
+            (consolidados[aid]["compras"] for aid in distantes if aid in consolidados),
+            decaimento,
+        )
+        total += 1
+    return total
@@ -4,7 +4,8 @@ Execute este script apos ter criado as tabelas e configurado as conexoes.
 """
 import subprocess
 import sys
-import os
+
+from conexoes import PG_DSN
 
 def executar_script(descricao, comando):
     print(f"\n{'='*60}")
@@ -47,9 +48,8 @@ def main():
     for descricao, script in scripts:
         if descricao == "PostgreSQL (Inserir Dados)":
             # Para SQL, usa psql
-            pg_dsn = os.getenv("PG_DSN", "dbname=postgres user=postgres password=postgres host=localhost port=5432")
             # Tenta executar com psql (funciona melhor em PowerShell)
-            cmd = f"psql \"{pg_dsn}\" -f {script}"
+            cmd = f"psql \"{PG_DSN}\" -f {script}"
         else:
             cmd = script
         
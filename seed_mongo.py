@@ -1,16 +1,53 @@
 """
 Script para popular o banco de dados MongoDB com dados de interesses dos clientes.
 Colecao: 'interesses'
+Com --clientes N gera documentos sinteticos em massa (veja gerador_dados.py).
 """
+import argparse
+import itertools
 import os
-from pymongo import MongoClient
+import time
+
+from pymongo import ASCENDING
+
+import conexoes
+from gerador_dados import SEMENTE_PADRAO, gerar_interesses
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "bd2")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "interesses")
 
+def criar_indices(colecao):
+    """Indice unico em id_cliente, usado pela leitura filtrada da integracao."""
+    colecao.create_index([("id_cliente", ASCENDING)], unique=True, name="id_cliente_unico")
+    print("[MongoDB] Indice 'id_cliente_unico' garantido")
+
+
+def seed_mongo_escala(n_clientes, semente=SEMENTE_PADRAO, tamanho_lote=10000):
+    """Insere documentos sinteticos com insert_many nao ordenado em lotes."""
+    cliente = conexoes.cliente_mongo()
+    colecao = cliente[MONGO_DB][MONGO_COLLECTION]
+    
+    colecao.drop()
+    print("[MongoDB] Colecao anterior removida")
+    
+    inicio = time.perf_counter()
+    docs = gerar_interesses(n_clientes, semente)
+    total = 0
+    while True:
+        lote = list(itertools.islice(docs, tamanho_lote))
+        if not lote:
+            break
+        resultado = colecao.insert_many(lote, ordered=False)
+        total += len(resultado.inserted_ids)
+    duracao = time.perf_counter() - inicio
+    print(f"[MongoDB] {total} documentos em {duracao:.2f}s ({total / max(duracao, 1e-9):,.0f} docs/s)")
+    
+    # Indice criado depois da carga: uma construcao so em vez de manter a cada insert
+    criar_indices(colecao)
+
+
 def seed_mongo():
-    cliente = MongoClient(MONGO_URI)
+    cliente = conexoes.cliente_mongo()
     db = cliente[MONGO_DB]
     colecao = db[MONGO_COLLECTION]
     
@@ -60,16 +97,23 @@ def seed_mongo():
     # Insere os documentos
     resultado = colecao.insert_many(interesses_docs)
     print(f"[MongoDB] Inseridos {len(resultado.inserted_ids)} documentos de interesses")
+    criar_indices(colecao)
     
     # Verifica os dados inseridos
     total = colecao.count_documents({})
     print(f"[MongoDB] Total de interesses no banco: {total}")
-    
-    cliente.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Popula o MongoDB com interesses de exemplo ou sinteticos")
+    parser.add_argument("--clientes", type=int, help="gera interesses sinteticos para N clientes")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO, help="semente para reproduzir os dados")
+    parser.add_argument("--lote", type=int, default=10000, help="documentos por insert_many")
+    args = parser.parse_args()
     try:
-        seed_mongo()
+        if args.clientes:
+            seed_mongo_escala(args.clientes, args.semente, args.lote)
+        else:
+            seed_mongo()
         print("Sucesso: MongoDB populado com dados de interesses!")
     except Exception as e:
         print(f"Erro ao popular MongoDB: {e}")
@@ -1,62 +1,91 @@
 """
 Script para popular o banco de dados Neo4j com dados de pessoas e amizades.
 Cria nodes 'Pessoa' e relacionamentos 'AMIGO_DE'.
+Com --clientes N gera um grafo social sintetico em massa (veja gerador_dados.py).
 """
+import argparse
+import itertools
 import os
-from neo4j import GraphDatabase
+import time
 
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j12345")
+import conexoes
+from gerador_dados import SEMENTE_PADRAO, gerar_amizades, gerar_clientes
 
-def seed_neo4j():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    
+TAMANHO_LOTE = int(os.getenv("NEO4J_LOTE", "10000"))
+
+CRIAR_PESSOAS = (
+    "UNWIND $rows AS row "
+    "CREATE (:Pessoa {id: row.id, cpf: row.cpf, nome: row.nome})"
+)
+# Com a constraint em Pessoa.id cada MATCH vira uma busca no indice, nao um scan
+CRIAR_AMIZADES = (
+    "UNWIND $rows AS row "
+    "MATCH (p1:Pessoa {id: row[0]}), (p2:Pessoa {id: row[1]}) "
+    "CREATE (p1)-[:AMIGO_DE]->(p2)"
+)
+
+
+def limpar_grafo(session, tamanho_lote=TAMANHO_LOTE):
+    """Remove as pessoas em lotes para nao estourar a memoria de uma transacao so."""
+    total = 0
+    while True:
+        removidas = session.run(
+            "MATCH (p:Pessoa) WITH p LIMIT $lote DETACH DELETE p RETURN count(*) AS total",
+            lote=tamanho_lote,
+        ).single()["total"]
+        total += removidas
+        if removidas == 0:
+            return total
+
+
+def criar_constraint(session):
+    session.run("CREATE CONSTRAINT pessoa_id_unico IF NOT EXISTS FOR (p:Pessoa) REQUIRE p.id IS UNIQUE")
+    print("[Neo4j] Constraint de unicidade em :Pessoa(id) garantida")
+
+
+def _carregar_em_lotes(session, consulta, linhas, tamanho_lote):
+    """Executa consulta com UNWIND $rows, um lote por transacao explicita."""
+    linhas = iter(linhas)
+    total = 0
+    while True:
+        lote = list(itertools.islice(linhas, tamanho_lote))
+        if not lote:
+            return total
+        session.execute_write(lambda tx: tx.run(consulta, rows=lote).consume())
+        total += len(lote)
+
+
+def carregar_grafo(driver, pessoas, amizades, tamanho_lote=TAMANHO_LOTE):
+    """Limpa o grafo, garante a constraint e carrega pessoas e amizades em lotes.
+
+    pessoas: iteravel de (id, cpf, nome); amizades: iteravel de (id1, id2).
+    """
     with driver.session() as session:
-        # Limpa dados anteriores
-        session.run("MATCH (p:Pessoa) DETACH DELETE p")
+        limpar_grafo(session, tamanho_lote)
         print("[Neo4j] Dados anteriores removidos")
         
-        # Cria nodes Pessoa
-        pessoas = [
-            (1, "12345678901", "Ana Silva"),
-            (2, "12345678902", "Bruno Costa"),
-            (3, "12345678903", "Carlos Oliveira"),
-            (4, "12345678904", "Diana Ferreira"),
-            (5, "12345678905", "Etienne Morales"),
-            (6, "12345678906", "Fernanda Lima"),
-        ]
+        criar_constraint(session)
         
-        for id_pessoa, cpf, nome in pessoas:
-            session.run(
-                "CREATE (:Pessoa {id: $id, cpf: $cpf, nome: $nome})",
-                id=id_pessoa,
-                cpf=cpf,
-                nome=nome
-            )
-        print(f"[Neo4j] Criados {len(pessoas)} nodes Pessoa")
+        inicio = time.perf_counter()
+        total_pessoas = _carregar_em_lotes(
+            session,
+            CRIAR_PESSOAS,
+            ({"id": id_pessoa, "cpf": cpf, "nome": nome} for id_pessoa, cpf, nome in pessoas),
+            tamanho_lote,
+        )
+        duracao = time.perf_counter() - inicio
+        print(f"[Neo4j] Criados {total_pessoas} nodes Pessoa em {duracao:.2f}s")
         
-        # Cria relacionamentos AMIGO_DE (amizades bidirecionais)
-        amizades = [
-            (1, 2),  # Ana e Bruno sao amigos
-            (1, 3),  # Ana e Carlos sao amigos
-            (2, 4),  # Bruno e Diana sao amigos
-            (3, 4),  # Carlos e Diana sao amigos
-            (3, 5),  # Carlos e Etienne sao amigos
-            (4, 6),  # Diana e Fernanda sao amigos
-            (5, 6),  # Etienne e Fernanda sao amigos
-            (1, 5),  # Ana e Etienne sao amigos
-        ]
-        
-        for id1, id2 in amizades:
-            # Cria relacionamento em ambas as direcoes
-            session.run(
-                "MATCH (p1:Pessoa {id: $id1}), (p2:Pessoa {id: $id2}) "
-                "CREATE (p1)-[:AMIGO_DE]->(p2)",
-                id1=id1,
-                id2=id2
-            )
-        print(f"[Neo4j] Criados {len(amizades)} relacionamentos AMIGO_DE")
+        inicio = time.perf_counter()
+        total_amizades = _carregar_em_lotes(
+            session,
+            CRIAR_AMIZADES,
+            ([id1, id2] for id1, id2 in amizades),
+            tamanho_lote,
+        )
+        duracao = time.perf_counter() - inicio
+        print(f"[Neo4j] Criados {total_amizades} relacionamentos AMIGO_DE em {duracao:.2f}s "
+              f"({total_amizades / max(duracao, 1e-9):,.0f} arestas/s)")
         
         # Verifica dados inseridos
         resultado = session.run("MATCH (p:Pessoa) RETURN COUNT(p) as total")
@@ -66,12 +95,53 @@ def seed_neo4j():
         resultado = session.run("MATCH ()-[r:AMIGO_DE]->() RETURN COUNT(r) as total")
         total_amizades = resultado.single()["total"]
         print(f"[Neo4j] Total de amizades no banco: {total_amizades}")
+
+def seed_neo4j():
+    driver = conexoes.driver_neo4j()
+    
+    # Nodes Pessoa
+    pessoas = [
+        (1, "12345678901", "Ana Silva"),
+        (2, "12345678902", "Bruno Costa"),
+        (3, "12345678903", "Carlos Oliveira"),
+        (4, "12345678904", "Diana Ferreira"),
+        (5, "12345678905", "Etienne Morales"),
+        (6, "12345678906", "Fernanda Lima"),
+    ]
     
-    driver.close()
+    # Relacionamentos AMIGO_DE
+    amizades = [
+        (1, 2),  # Ana e Bruno sao amigos
+        (1, 3),  # Ana e Carlos sao amigos
+        (2, 4),  # Bruno e Diana sao amigos
+        (3, 4),  # Carlos e Diana sao amigos
+        (3, 5),  # Carlos e Etienne sao amigos
+        (4, 6),  # Diana e Fernanda sao amigos
+        (5, 6),  # Etienne e Fernanda sao amigos
+        (1, 5),  # Ana e Etienne sao amigos
+    ]
+    
+    carregar_grafo(driver, pessoas, amizades)
+
+def seed_neo4j_escala(n_clientes, grau_medio, semente=SEMENTE_PADRAO, tamanho_lote=TAMANHO_LOTE):
+    """Carrega um grafo social sintetico com os mesmos clientes do PostgreSQL."""
+    driver = conexoes.driver_neo4j()
+    pessoas = ((cid, cpf, nome) for cid, cpf, nome, *_ in gerar_clientes(n_clientes, semente))
+    amizades = gerar_amizades(n_clientes, grau_medio, semente)
+    carregar_grafo(driver, pessoas, amizades, tamanho_lote)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Popula o Neo4j com amizades de exemplo ou sinteticas")
+    parser.add_argument("--clientes", type=int, help="gera um grafo sintetico com N pessoas")
+    parser.add_argument("--grau-medio", type=float, default=10.0, help="media de amigos por pessoa")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO, help="semente para reproduzir os dados")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="linhas por transacao UNWIND")
+    args = parser.parse_args()
     try:
-        seed_neo4j()
+        if args.clientes:
+            seed_neo4j_escala(args.clientes, args.grau_medio, args.semente, args.lote)
+        else:
+            seed_neo4j()
         print("Sucesso: Neo4j populado com dados de pessoas e amizades!")
     except Exception as e:
         print(f"Erro ao popular Neo4j: {e}")
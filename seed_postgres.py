@@ -1,15 +1,22 @@
 """
 Script para popular o PostgreSQL com dados de clientes, produtos e compras.
 Versao Python - nao requer psql.
+Com --clientes N gera uma base sintetica em massa via COPY (veja gerador_dados.py).
 """
-import psycopg2
+import argparse
+import csv
+import io
+import itertools
+import time
 from datetime import datetime
-import os
 
-PG_DSN = os.getenv("PG_DSN", "dbname=postgres user=postgres password=postgres host=localhost port=5432")
+from psycopg2.extras import execute_values
+
+import conexoes
+from gerador_dados import SEMENTE_PADRAO, gerar_clientes, gerar_compras, gerar_produtos
 
 def seed_postgres():
-    conn = psycopg2.connect(PG_DSN)
+    conn = conexoes.emprestar_postgres()
     cur = conn.cursor()
     
     try:
@@ -104,11 +111,155 @@ def seed_postgres():
         raise
     finally:
         cur.close()
-        conn.close()
+        conexoes.devolver_postgres(conn)
+
+# Constraints e indices removidos durante a carga em massa e recriados no final
+RESTRICOES = [
+    ("compras", "compras_id_produto_fkey", "FOREIGN KEY (id_produto) REFERENCES produtos(id)"),
+    ("compras", "compras_id_cliente_fkey", "FOREIGN KEY (id_cliente) REFERENCES clientes(id)"),
+    ("compras", "compras_pkey", "PRIMARY KEY (id)"),
+    ("produtos", "produtos_pkey", "PRIMARY KEY (id)"),
+    ("clientes", "clientes_cpf_key", "UNIQUE (cpf)"),
+    ("clientes", "clientes_pkey", "PRIMARY KEY (id)"),
+]
+INDICES = [
+    ("compras_id_cliente_idx", "CREATE INDEX compras_id_cliente_idx ON compras (id_cliente)"),
+]
+
+
+class _LinhasCSV(io.TextIOBase):
+    """Arquivo somente leitura que gera CSV sob demanda a partir de tuplas.
+
+    Permite passar um gerador de linhas direto para COPY FROM STDIN sem montar a
+    tabela inteira em memoria.
+    """
+
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._buffer = io.StringIO()
+        self._escritor = csv.writer(self._buffer, lineterminator="\n")
+        self._pendente = ""
+        self.total = 0
+
+    def readable(self):
+        return True
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self._pendente) < tamanho:
+            lote = list(itertools.islice(self._linhas, 1000))
+            if not lote:
+                break
+            self._escritor.writerows(lote)
+            self.total += len(lote)
+            self._pendente += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if tamanho < 0:
+            tamanho = len(self._pendente)
+        dados, self._pendente = self._pendente[:tamanho], self._pendente[tamanho:]
+        return dados
+
+    readline = read
+
+
+def carregar_tabela(cur, tabela, colunas, linhas, usar_copy=True, lote=10000):
+    """Carrega linhas com COPY FROM STDIN (ou execute_values); retorna (linhas, segundos)."""
+    inicio = time.perf_counter()
+    if usar_copy:
+        arquivo = _LinhasCSV(linhas)
+        cur.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", arquivo)
+        total = arquivo.total
+    else:
+        total = 0
+        sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES %s"
+        linhas = iter(linhas)
+        while True:
+            bloco = list(itertools.islice(linhas, lote))
+            if not bloco:
+                break
+            execute_values(cur, sql, bloco, page_size=lote)
+            total += len(bloco)
+    duracao = time.perf_counter() - inicio
+    print(f"[PostgreSQL] {tabela}: {total} linhas em {duracao:.2f}s ({total / max(duracao, 1e-9):,.0f} linhas/s)")
+    return total, duracao
+
+
+def seed_postgres_escala(n_clientes, m_produtos, k_compras, semente=SEMENTE_PADRAO, usar_copy=True):
+    """Popula as tabelas com dados sinteticos em massa.
+
+    Usa o esquema de criar_tabelas_postgres.py. Constraints e indices sao removidos
+    antes da carga e recriados depois, tudo em uma unica transacao.
+    """
+    conn = conexoes.emprestar_postgres()
+    cur = conn.cursor()
+    inicio = time.perf_counter()
+    try:
+        print("[PostgreSQL] Limpando dados anteriores...")
+        cur.execute("TRUNCATE compras, produtos, clientes")
+
+        print("[PostgreSQL] Removendo constraints e indices para a carga...")
+        for nome, _ in INDICES:
+            cur.execute(f"DROP INDEX IF EXISTS {nome}")
+        for tabela, nome, _ in RESTRICOES:
+            cur.execute(f"ALTER TABLE {tabela} DROP CONSTRAINT IF EXISTS {nome}")
+
+        total = 0
+        total += carregar_tabela(cur, "clientes", ("id", "cpf", "nome", "endereco", "cidade", "uf", "email"),
+                                 gerar_clientes(n_clientes, semente), usar_copy)[0]
+        total += carregar_tabela(cur, "produtos", ("id", "produto", "valor", "quantidade", "tipo"),
+                                 gerar_produtos(m_produtos, semente), usar_copy)[0]
+        total += carregar_tabela(cur, "compras", ("id", "id_produto", "data", "id_cliente"),
+                                 gerar_compras(k_compras, n_clientes, m_produtos, semente), usar_copy)[0]
+        duracao_carga = time.perf_counter() - inicio
+
+        print("[PostgreSQL] Recriando constraints e indices...")
+        inicio_indices = time.perf_counter()
+        for tabela, nome, definicao in reversed(RESTRICOES):
+            cur.execute(f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao}")
+        for _, criar in INDICES:
+            cur.execute(criar)
+        print(f"[PostgreSQL] Constraints e indices em {time.perf_counter() - inicio_indices:.2f}s")
+
+        # Ajusta as sequencias SERIAL para continuar depois dos ids gerados
+        for tabela in ("clientes", "produtos", "compras"):
+            cur.execute(
+                f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), GREATEST(MAX(id), 1)) FROM {tabela}"
+            )
+        conn.commit()
+        cur.execute("ANALYZE clientes, produtos, compras")
+        conn.commit()
+
+        duracao = time.perf_counter() - inicio
+        print(f"[PostgreSQL] Carga: {total} linhas em {duracao_carga:.2f}s ({total / max(duracao_carga, 1e-9):,.0f} linhas/s)")
+        print(f"[PostgreSQL] Total com constraints/indices: {duracao:.2f}s")
+    except Exception as e:
+        conn.rollback()
+        print(f"[PostgreSQL] Erro: {e}")
+        raise
+    finally:
+        cur.close()
+        conexoes.devolver_postgres(conn)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Popula o PostgreSQL com dados de exemplo ou sinteticos")
+    parser.add_argument("--clientes", type=int, help="gera N clientes sinteticos em vez dos dados de exemplo")
+    parser.add_argument("--produtos", type=int, default=1000, help="quantidade de produtos sinteticos")
+    parser.add_argument("--compras", type=int, help="quantidade de compras sinteticas (padrao 10 por cliente)")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO, help="semente para reproduzir os dados")
+    parser.add_argument("--sem-copy", action="store_true", help="usa execute_values em vez de COPY")
+    args = parser.parse_args()
     try:
-        seed_postgres()
+        if args.clientes:
+            seed_postgres_escala(
+                args.clientes,
+                args.produtos,
+                args.compras if args.compras is not None else args.clientes * 10,
+                args.semente,
+                usar_copy=not args.sem_copy,
+            )
+        else:
+            seed_postgres()
         print("\nSucesso: PostgreSQL populado com dados!")
     except Exception as e:
         print(f"\nErro ao popular PostgreSQL: {e}")
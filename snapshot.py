@@ -0,0 +1,258 @@
+"""
+Leitura e escrita do snapshot dos dados consolidados.
+O formato eh "<serializacao>[+<compressao>]", ex.: "json", "orjson", "msgpack+zstd".
+json continua sendo o padrao (legivel e sem dependencias extras); orjson e
+msgpack geram arquivos menores e carregam bem mais rapido. A leitura detecta o
+formato pelos primeiros bytes, entao a API abre qualquer snapshot gravado.
+
+O formato "indexado" eh diferente: um indice de largura fixa
+id -> (offset, tamanho) seguido de um registro codificado por cliente. Ele eh
+aberto com mmap e so decodifica os clientes consultados (ver SnapshotIndexado).
+No Windows ele eh lido para a memoria em vez de mapeado: la um arquivo mapeado
+nao pode ser substituido, e a API prenderia o snapshot enquanto estivesse no ar.
+"""
+import gzip
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections.abc import Mapping
+from functools import partial
+from typing import Any, Dict, Iterator, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # opcional: so necessario para o formato orjson
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # opcional: so necessario para o formato msgpack
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # opcional: so necessario para a compressao zstd
+    zstandard = None
+
+SNAPSHOT_FORMATO = os.getenv("SNAPSHOT_FORMATO", "json")
+ZSTD_NIVEL = int(os.getenv("SNAPSHOT_ZSTD_NIVEL", "3"))
+GZIP_NIVEL = int(os.getenv("SNAPSHOT_GZIP_NIVEL", "6"))
+# No Windows os.replace falha (PermissionError) enquanto outro processo esta com o
+# destino aberto, o que acontece enquanto a API rele o snapshot; tenta de novo
+TROCA_TENTATIVAS = int(os.getenv("SNAPSHOT_TROCA_TENTATIVAS", "20"))
+TROCA_ESPERA_SEGUNDOS = 0.05
+# Mapear o snapshot indexado (mmap); desligado no Windows, ver docstring do modulo
+MAPEAR_INDEXADO = os.name != "nt"
+
+SERIALIZACOES = ("json", "orjson", "msgpack")
+COMPRESSOES = ("gzip", "zstd")
+FORMATOS = SERIALIZACOES + tuple(f"{s}+{c}" for s in SERIALIZACOES for c in COMPRESSOES) + ("indexado",)
+
+_MAGICO_GZIP = b"\x1f\x8b"
+_MAGICO_ZSTD = b"\x28\xb5\x2f\xfd"
+# Extensao de arquivo de cada parte do formato
+_EXTENSOES = {"json": "json", "orjson": "json", "msgpack": "msgpack", "gzip": "gz", "zstd": "zst",
+              "indexado": "idx"}
+
+# Formato indexado: cabecalho (magico, codec dos registros, total de clientes),
+# depois uma entrada (id, offset, tamanho) por cliente em ordem de id e por fim
+# os registros. Offsets sao absolutos, a partir do inicio do arquivo.
+_MAGICO_INDEXADO = b"BD2SNAP1"
+_CABECALHO = struct.Struct("<8sc7xQ")
+_DTYPE_INDICE = np.dtype([("id", "<i8"), ("offset", "<u8"), ("tamanho", "<u4")])
+
+
+def _partes(formato: str):
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de snapshot desconhecido: '{formato}' (use um de {', '.join(FORMATOS)})")
+    serializacao, _, compressao = formato.partition("+")
+    return serializacao, compressao or None
+
+
+def _exigir(modulo, pacote: str):
+    if modulo is None:
+        raise RuntimeError(f"O formato escolhido precisa do pacote '{pacote}' (pip install {pacote})")
+    return modulo
+
+
+def caminho(base: str, formato: str = SNAPSHOT_FORMATO) -> str:
+    """Nome do arquivo para o formato, ex.: dados_consolidados.json -> dados_consolidados.msgpack.zst."""
+    serializacao, compressao = _partes(formato)
+    if formato == "json":
+        return base
+    raiz = os.path.splitext(base)[0]
+    extensao = _EXTENSOES[serializacao]
+    if compressao:
+        extensao += "." + _EXTENSOES[compressao]
+    return f"{raiz}.{extensao}"
+
+
+def _padrao(valor):
+    """Listas compactas em array (ex.: amigos da integracao) viram list so ao serializar."""
+    if isinstance(valor, array):
+        return valor.tolist()
+    raise TypeError(f"Objeto do tipo {type(valor).__name__} nao serializavel")
+
+
+def serializar(dados: Dict[str, Any], formato: str = SNAPSHOT_FORMATO) -> bytes:
+    serializacao, compressao = _partes(formato)
+    if serializacao == "indexado":
+        return _serializar_indexado(dados)
+    if serializacao == "json":
+        corpo = json.dumps(dados, ensure_ascii=False, indent=2, default=_padrao).encode("utf-8")
+    elif serializacao == "orjson":
+        corpo = _exigir(orjson, "orjson").dumps(dados, default=_padrao)
+    else:
+        corpo = _exigir(msgpack, "msgpack").packb(dados, use_bin_type=True, default=_padrao)
+
+    if compressao == "gzip":
+        return gzip.compress(corpo, compresslevel=GZIP_NIVEL)
+    if compressao == "zstd":
+        return _exigir(zstandard, "zstandard").ZstdCompressor(level=ZSTD_NIVEL).compress(corpo)
+    return corpo
+
+
+def desserializar(conteudo: bytes) -> Dict[str, Any]:
+    """Decodifica um snapshot em qualquer formato, detectado pelos primeiros bytes."""
+    if conteudo.startswith(_MAGICO_INDEXADO):
+        return dict(SnapshotIndexado(conteudo))
+    try:
+        if conteudo.startswith(_MAGICO_GZIP):
+            conteudo = gzip.decompress(conteudo)
+        elif conteudo.startswith(_MAGICO_ZSTD):
+            conteudo = _exigir(zstandard, "zstandard").ZstdDecompressor().decompressobj().decompress(conteudo)
+
+        # JSON sempre comeca com '{' (ou espaco); um mapa msgpack nao
+        inicio = conteudo.lstrip()[:1]
+        if inicio in (b"{", b""):
+            if orjson is not None:
+                return orjson.loads(conteudo)
+            return json.loads(conteudo)
+        return _exigir(msgpack, "msgpack").unpackb(conteudo, raw=False)
+    except (ValueError, EOFError, RuntimeError):
+        raise
+    except Exception as exc:
+        # Erros das bibliotecas de compressao viram ValueError, como no json.load
+        raise ValueError(f"Snapshot invalido: {exc}") from exc
+
+
+def salvar(arquivo: str, dados: Dict[str, Any], formato: str = SNAPSHOT_FORMATO):
+    """Grava em arquivo temporario e troca de uma vez para o leitor nunca ver o arquivo pela metade."""
+    conteudo = serializar(dados, formato)
+    temporario = f"{arquivo}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+    _substituir(temporario, arquivo)
+    return len(conteudo)
+
+
+def _substituir(origem: str, destino: str):
+    """os.replace com novas tentativas enquanto o destino estiver aberto por um leitor (Windows)."""
+    for tentativa in range(1, TROCA_TENTATIVAS + 1):
+        try:
+            os.replace(origem, destino)
+            return
+        except PermissionError:
+            if tentativa >= TROCA_TENTATIVAS:
+                raise
+            time.sleep(TROCA_ESPERA_SEGUNDOS * tentativa)
+
+
+def carregar(arquivo: str) -> Union[Dict[str, Any], "SnapshotIndexado"]:
+    """Le um snapshot; o formato indexado eh mapeado em memoria em vez de decodificado."""
+    with open(arquivo, "rb") as f:
+        if f.read(len(_MAGICO_INDEXADO)) == _MAGICO_INDEXADO:
+            if not MAPEAR_INDEXADO:
+                f.seek(0)
+                return SnapshotIndexado(f.read())
+            return SnapshotIndexado(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        f.seek(0)
+        return desserializar(f.read())
+
+
+def _codec_registros():
+    """msgpack se disponivel, senao JSON compacto: (byte do cabecalho, codificador)."""
+    if msgpack is not None:
+        return b"m", lambda payload: msgpack.packb(payload, use_bin_type=True, default=_padrao)
+    if orjson is not None:
+        return b"j", partial(orjson.dumps, default=_padrao)
+    return b"j", lambda payload: json.dumps(payload, ensure_ascii=False, separators=(",", ":"),
+                                            default=_padrao).encode("utf-8")
+
+
+def _serializar_indexado(dados: Dict[str, Any]) -> bytes:
+    codec, codificar = _codec_registros()
+    ids = sorted(int(cid) for cid in dados)
+    registros = [codificar(dados[str(cid)]) for cid in ids]
+
+    indice = np.zeros(len(ids), dtype=_DTYPE_INDICE)
+    indice["id"] = ids
+    indice["tamanho"] = [len(r) for r in registros]
+    inicio = _CABECALHO.size + indice.nbytes
+    if len(ids):
+        indice["offset"][0] = inicio
+        np.cumsum(indice["tamanho"][:-1], out=indice["offset"][1:])
+        indice["offset"][1:] += inicio
+    return b"".join([_CABECALHO.pack(_MAGICO_INDEXADO, codec, len(ids)), indice.tobytes(), *registros])
+
+
+class SnapshotIndexado(Mapping):
+    """Snapshot indexado visto como um dict {str(id): payload} somente leitura.
+
+    O arquivo fica mapeado em memoria (mmap): abrir custa so a validacao do
+    cabecalho, e cada acesso acha o id por busca binaria no indice e decodifica
+    apenas aquele registro. A memoria residente nao cresce com o numero de
+    clientes, e workers da API no mesmo host compartilham as paginas do arquivo.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        if len(buffer) < _CABECALHO.size:
+            raise ValueError("Snapshot indexado truncado")
+        magico, codec, total = _CABECALHO.unpack_from(buffer, 0)
+        if magico != _MAGICO_INDEXADO:
+            raise ValueError("Arquivo nao eh um snapshot indexado")
+        if _CABECALHO.size + total * _DTYPE_INDICE.itemsize > len(buffer):
+            raise ValueError("Snapshot indexado truncado")
+        self._indice = np.frombuffer(buffer, dtype=_DTYPE_INDICE, count=total, offset=_CABECALHO.size)
+        if total and int(self._indice["offset"][-1]) + int(self._indice["tamanho"][-1]) > len(buffer):
+            raise ValueError("Snapshot indexado truncado")
+        # Ids ordenados (visao do proprio mmap, sem copia)
+        self.ids = self._indice["id"]
+        if codec == b"m":
+            self._decodificar = partial(_exigir(msgpack, "msgpack").unpackb, raw=False)
+        else:
+            self._decodificar = orjson.loads if orjson is not None else json.loads
+
+    def _posicao(self, cid: int):
+        pos = int(np.searchsorted(self.ids, cid))
+        if pos < len(self.ids) and self.ids[pos] == cid:
+            return pos
+        return None
+
+    def _chave(self, chave):
+        try:
+            return self._posicao(int(chave))
+        except (TypeError, ValueError):
+            return None
+
+    def __getitem__(self, chave) -> Dict[str, Any]:
+        pos = self._chave(chave)
+        if pos is None:
+            raise KeyError(chave)
+        inicio, tamanho = int(self._indice["offset"][pos]), int(self._indice["tamanho"][pos])
+        return self._decodificar(self._buffer[inicio:inicio + tamanho])
+
+    def __contains__(self, chave) -> bool:
+        return self._chave(chave) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(cid) for cid in self.ids.tolist())
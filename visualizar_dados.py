@@ -4,27 +4,35 @@ Funciona com Redis ou com o arquivo JSON de fallback.
 """
 import json
 import os
-import redis
 
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+from chaves_redis import chave_cliente, resolver_geracao
+import conexoes
+import snapshot
+
+ARQUIVO_DADOS = snapshot.caminho(os.getenv("ARQUIVO_DADOS", "dados_consolidados.json"))
 
 def visualizar_redis():
     """Exibe dados do Redis."""
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        r = conexoes.cliente_redis()
         r.ping()
         
         print("\n" + "="*60)
         print("DADOS NO REDIS")
         print("="*60)
         
-        chaves_cliente = r.keys("cliente:*")
+        # Resolve a geracao publicada uma unica vez para toda a listagem
+        geracao = resolver_geracao(r)
+        if geracao is None:
+            print("[AVISO] Redis sem dados consolidados (geracao:atual ausente)")
+            return False
+        print(f"Geracao: v{geracao}")
+        base = chave_cliente(geracao, "")
+        chaves_cliente = r.scan_iter(match=f"{base}*", count=1000)
         
         for chave in sorted(chaves_cliente):
-            if ":" in chave and chave.count(":") == 1:  # Apenas cliente:id
-                cid = chave.split(":")[1]
+            if chave[len(base):].isdigit():  # Apenas v{n}:cliente:id
+                cid = chave[len(base):]
                 
                 print(f"\n--- Cliente {cid} ---")
                 
@@ -34,19 +42,19 @@ def visualizar_redis():
                     print(f"  {k}: {v}")
                 
                 # Amigos
-                amigos = r.lrange(f"cliente:{cid}:amigos", 0, -1)
+                amigos = r.lrange(f"{chave}:amigos", 0, -1)
                 if amigos:
                     print(f"  amigos: {amigos}")
                 
                 # Interesses
-                interesses = r.get(f"cliente:{cid}:interesses")
+                interesses = r.get(f"{chave}:interesses")
                 if interesses:
                     int_dict = json.loads(interesses)
                     if int_dict:
                         print(f"  interesses: {int_dict.get('interesses', [])}")
                 
                 # Compras (resumo)
-                compras = r.lrange(f"cliente:{cid}:compras", 0, -1)
+                compras = r.lrange(f"{chave}:compras", 0, -1)
                 if compras:
                     print(f"  total de compras: {len(compras)}")
                     for i, comp_json in enumerate(compras[:2], 1):  # Mostra apenas as 2 primeiras
@@ -63,8 +71,8 @@ def visualizar_redis():
 def visualizar_json():
     """Exibe dados do arquivo JSON."""
     try:
-        if not os.path.exists("dados_consolidados.json"):
-            print("[ERRO] Arquivo 'dados_consolidados.json' nao encontrado.")
+        if not os.path.exists(ARQUIVO_DADOS):
+            print(f"[ERRO] Arquivo '{ARQUIVO_DADOS}' nao encontrado.")
             print("Execute 'python integracao.py' primeiro para gerar o arquivo.")
             return False
         
@@ -72,8 +80,7 @@ def visualizar_json():
         print("DADOS NO ARQUIVO JSON")
         print("="*60)
         
-        with open("dados_consolidados.json", "r", encoding="utf-8") as f:
-            dados = json.load(f)
+        dados = snapshot.carregar(ARQUIVO_DADOS)
         
         for cid, payload in dados.items():
             print(f"\n--- Cliente {cid} ---")